@@ -8,11 +8,13 @@ from flask import Flask, Blueprint, jsonify
 from flask_cors import CORS
 
 from flask_migrate import Migrate
-from db import db, init_db
+from db import db, init_db, engine_options
 
 from flask_login import LoginManager
 
 from cache import init_cache
+from controllers.autosave import flush_before_request
+from controllers.user import load_cached_user
 
 
 from views.auth import auth_view
@@ -36,6 +38,9 @@ CORS(app, resources={r"/api/*": {"origins": CLIENT_ORIGIN}})
 app.config["SQLALCHEMY_DATABASE_URI"] = (
     os.environ.get("DATABASE_URL") or "sqlite:///:memory:"
 )
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+    app.config["SQLALCHEMY_DATABASE_URI"]
+)
 app.secret_key = os.environ.get("SECRET_KEY") or os.urandom(24)
 
 # Init flask cache middleware
@@ -50,10 +55,7 @@ login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id: int):
-    from models.user import User
-
-    stmt = db.select(User).filter_by(id=user_id)
-    return db.session.execute(stmt).scalar()
+    return load_cached_user(user_id, db.session)
 
 
 # API Routes
@@ -71,6 +73,9 @@ main_view.register_blueprint(user_views)
 main_view.register_blueprint(compile_views)
 main_view.register_blueprint(ai_views)
 
+# Pending coalesced resume updates are written before any other request of the user
+main_view.before_request(flush_before_request)
+
 app.register_blueprint(main_view)
 
 init_db(app)
@@ -0,0 +1,135 @@
+"""
+Cache stampede benchmark: many concurrent requests miss the same cached
+response at once, and the number of database queries they cause is reported,
+for a plain cache-aside fill and for cache_response's single-flight fill.
+
+    python benchmarks/cache_stampede.py
+    python benchmarks/cache_stampede.py --redis-url redis://localhost:6379/15 --processes 4
+
+SimpleCache is always measured (one process, it isn't shared). TwoTierCache is
+measured too when a Redis URL is given, across --processes processes.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+from flask_caching import Cache
+from flask_login import LoginManager
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import NullPool
+
+# Run from api/ or anywhere else, the API's modules are imported from api/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache as cache_module  # noqa: E402
+from cache import cache_response, make_cache_key  # noqa: E402
+
+
+def make_app(cache_config: dict, queries, query_time: float) -> Flask:
+    app = Flask(__name__)
+    # Every client is anonymous, so they all share the same cache key
+    LoginManager(app).user_loader(lambda user_id: None)
+    cache_module.cache = Cache(app, config=cache_config)
+
+    engine = create_engine("sqlite://", poolclass=NullPool)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_query(*args):
+        with queries.get_lock():
+            queries.value += 1
+
+    def query():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        # Stands in for a slow query, the window in which others miss too
+        time.sleep(query_time)
+        return {"ok": True}
+
+    @app.get("/naive")
+    def naive():
+        key = make_cache_key()
+        result = cache_module.cache.get(key)
+        if result is None:
+            result = query()
+            cache_module.cache.set(key, result)
+        return result
+
+    @app.get("/single-flight")
+    @cache_response
+    def single_flight():
+        return query()
+
+    return app
+
+
+def run_clients(cache_config, path, threads, barrier, queries, query_time):
+    app = make_app(cache_config, queries, query_time)
+
+    def get(_):
+        client = app.test_client()
+        barrier.wait()
+        return client.get(path).status_code
+
+    with ThreadPoolExecutor(threads) as executor:
+        statuses = list(executor.map(get, range(threads)))
+    assert all(status == 200 for status in statuses), statuses
+
+
+def measure(cache_config: dict, mode: str, processes: int, threads: int, query_time):
+    # A path never requested before, so every client misses
+    path = f"/{mode}?run={uuid.uuid4().hex}"
+    ctx = multiprocessing.get_context("fork")
+    queries = ctx.Value("i", 0)
+    barrier = ctx.Barrier(processes * threads)
+    args = (cache_config, path, threads, barrier, queries, query_time)
+
+    start = time.monotonic()
+    if processes == 1:
+        run_clients(*args)
+    else:
+        children = [
+            ctx.Process(target=run_clients, args=args) for _ in range(processes)
+        ]
+        for child in children:
+            child.start()
+        for child in children:
+            child.join()
+            assert child.exitcode == 0
+    return queries.value, time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=50, help="clients per process")
+    parser.add_argument("--processes", type=int, default=1, help="for TwoTierCache")
+    parser.add_argument("--query-time", type=float, default=0.05, help="seconds")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL"))
+    args = parser.parse_args()
+
+    backends = [("SimpleCache", {"CACHE_TYPE": "SimpleCache"}, 1)]
+    if args.redis_url:
+        config = {
+            "CACHE_TYPE": "cache.TwoTierCache",
+            "CACHE_REDIS_URL": args.redis_url,
+            "CACHE_KEY_PREFIX": "stampede_benchmark:",
+        }
+        backends.append(("TwoTierCache", config, args.processes))
+
+    print(f"{'cache':<14}{'fill':<15}{'requests':>10}{'db queries':>12}{'seconds':>10}")
+    for name, config, processes in backends:
+        for mode in ("naive", "single-flight"):
+            count, elapsed = measure(
+                config, mode, processes, args.threads, args.query_time
+            )
+            requests = processes * args.threads
+            print(f"{name:<14}{mode:<15}{requests:>10}{count:>12}{elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
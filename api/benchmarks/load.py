@@ -0,0 +1,219 @@
+"""
+Load generator for the API's read endpoints: clients in several processes
+request the given paths for a while, as fast as the API answers, and the
+throughput, latencies and status codes are reported.
+
+    python benchmarks/load.py --workers 1 2 4 8
+    python benchmarks/load.py --url http://localhost:5001 --cookie <session cookie>
+
+With --workers, gunicorn is started with gunicorn.conf.py and each number of
+workers in turn, serving a temporary SQLite database seeded with a user and
+--resumes resumes, and the requests are logged in as that user. Otherwise a
+running API is loaded, with the session cookie of a logged in browser. Showing
+how throughput scales with workers needs more cores than the largest worker
+count, so that the clients don't compete with the API for them.
+"""
+
+import argparse
+import multiprocessing
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from threading import Thread
+
+import requests
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run from api/ or anywhere else, the API's modules are imported from api/
+sys.path.insert(0, API_DIR)
+
+from db import db  # noqa: E402
+from controllers.resume import create_new_resume  # noqa: E402
+from models.rating import ResumeRating  # noqa: E402, F401
+from models.template import Template  # noqa: E402
+from models.user import User  # noqa: E402
+
+DEFAULT_PATHS = ["/api/resume/all", "/api/resume/1", "/api/user/me"]
+
+
+def seed(database_url: str, resumes: int) -> int:
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Template(id=1, name="Default", uri=""))
+        user = User(
+            google_id="load", name="Load", email="load@example.com", profile_picture=""
+        )
+        db.session.add(user)
+        db.session.flush()
+        for _ in range(resumes):
+            create_new_resume(user, db.session)
+        db.session.commit()
+        user_id = user.id
+        db.engine.dispose()
+    return user_id
+
+
+def session_cookie(secret_key: str, user_id: int) -> str:
+    # Signed the way Flask signs the session Flask-Login keeps the user id in
+    app = Flask(__name__)
+    app.secret_key = secret_key
+    serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+    return serializer.dumps({"_user_id": str(user_id), "_fresh": True})
+
+
+def run_client(url, cookie, paths, threads, duration, barrier, results):
+    latencies, statuses = [], Counter()
+
+    def client(offset: int):
+        session = requests.Session()
+        session.cookies.set("session", cookie)
+        barrier.wait()
+        deadline = time.monotonic() + duration
+        i = offset
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                status = session.get(
+                    url + paths[i % len(paths)], timeout=30
+                ).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            i += 1
+
+    pool = [Thread(target=client, args=(offset,)) for offset in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((latencies, statuses))
+
+
+def measure(url: str, cookie: str, args) -> tuple[list[float], Counter]:
+    ctx = multiprocessing.get_context("fork")
+    barrier = ctx.Barrier(args.processes * args.threads)
+    results = ctx.Queue()
+    clients = [
+        ctx.Process(
+            target=run_client,
+            args=(
+                url,
+                cookie,
+                args.paths,
+                args.threads,
+                args.duration,
+                barrier,
+                results,
+            ),
+        )
+        for _ in range(args.processes)
+    ]
+    for process in clients:
+        process.start()
+    latencies, statuses = [], Counter()
+    for _ in clients:
+        process_latencies, process_statuses = results.get()
+        latencies += process_latencies
+        statuses += process_statuses
+    for process in clients:
+        process.join()
+    return latencies, statuses
+
+
+def start_api(workers: int, port: int, env: dict) -> subprocess.Popen:
+    api = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            "gunicorn.conf.py",
+            "-b",
+            f"127.0.0.1:{port}",
+            "app:app",
+        ],
+        cwd=API_DIR,
+        env={**env, "WEB_CONCURRENCY": str(workers)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and api.poll() is None:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/ping", timeout=1)
+            return api
+        except requests.RequestException:
+            time.sleep(0.2)
+    api.kill()
+    raise RuntimeError("The API did not start, run gunicorn by hand to see why")
+
+
+def report(label: str, latencies: list[float], statuses: Counter, duration: float):
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100)
+        p50, p99 = percentiles[49] * 1000, percentiles[98] * 1000
+    else:
+        p50 = p99 = float("nan")
+    codes = " ".join(f"{status}:{count}" for status, count in sorted(statuses.items()))
+    print(
+        f"{label:<10}{len(latencies):>10}{len(latencies) / duration:>10.1f}"
+        f"{p50:>10.1f}{p99:>10.1f}  {codes}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", help="gunicorn workers")
+    parser.add_argument("--url", help="of a running API, instead of --workers")
+    parser.add_argument("--cookie", help="session cookie, with --url")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--processes", type=int, default=4, help="client processes")
+    parser.add_argument("--threads", type=int, default=8, help="clients per process")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--resumes", type=int, default=5, help="with --workers")
+    parser.add_argument("--port", type=int, default=8099, help="with --workers")
+    args = parser.parse_args()
+    if bool(args.workers) == bool(args.url):
+        parser.error("give either --workers or --url")
+
+    print(f"{'workers':<10}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    if args.url:
+        latencies, statuses = measure(args.url.rstrip("/"), args.cookie or "", args)
+        report("-", latencies, statuses, args.duration)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_url = f"sqlite:///{tmpdir}/load.sqlite"
+        user_id = seed(database_url, args.resumes)
+        secret_key = secrets.token_hex(24)
+        env = {**os.environ, "DATABASE_URL": database_url, "SECRET_KEY": secret_key}
+        # Required to start the API, the read endpoints never call Gemini
+        env.setdefault("GEMINI_API_KEY", "unused")
+        cookie = session_cookie(secret_key, user_id)
+
+        for workers in args.workers:
+            api = start_api(workers, args.port, env)
+            try:
+                latencies, statuses = measure(
+                    f"http://127.0.0.1:{args.port}", cookie, args
+                )
+            finally:
+                api.terminate()
+                api.wait()
+            report(str(workers), latencies, statuses, args.duration)
+
+
+if __name__ == "__main__":
+    main()
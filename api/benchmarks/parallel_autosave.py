@@ -0,0 +1,166 @@
+"""
+Parallel autosave benchmark: several processes (as gunicorn workers) with
+several threads each save full edits of their own resume at the same time,
+and the saves that succeed or fail (e.g. with "database is locked") are
+reported together with the throughput.
+
+    python benchmarks/parallel_autosave.py
+    python benchmarks/parallel_autosave.py --processes 8 --threads 8 --sqlite-defaults
+
+Runs against a temporary SQLite file unless given a --database-url, which must
+point at a scratch database. --sqlite-defaults opens SQLite connections without
+the WAL, synchronous and busy_timeout settings of db.py, for comparison.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from threading import Thread
+
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+# Run from api/ or anywhere else, the API's modules are imported from api/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db as db_module  # noqa: E402
+from db import db, engine_options  # noqa: E402
+from controllers.resume import (  # noqa: E402
+    create_new_resume,
+    get_full_resume,
+    mark_resume_changed,
+    process_resume_update,
+)
+from models.rating import ResumeRating  # noqa: E402, F401
+from models.template import Template  # noqa: E402
+from models.user import User  # noqa: E402
+
+
+def make_app(database_url: str) -> Flask:
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_url)
+    db.init_app(app)
+    return app
+
+
+def seed(database_url: str, writers: int) -> list[tuple[int, int]]:
+    # One user with one resume per writer, so writers never conflict on a row
+    app = make_app(database_url)
+    with app.app_context():
+        db.create_all()
+        if not db.session.get(Template, 1):
+            db.session.add(Template(id=1, name="Default", uri=""))
+        run = time.time_ns()
+        resumes = []
+        for writer in range(writers):
+            user = User(
+                google_id=f"autosave-{run}-{writer}",
+                name=f"Writer {writer}",
+                email=f"autosave-{run}-{writer}@example.com",
+                profile_picture="",
+            )
+            db.session.add(user)
+            db.session.flush()
+            resumes.append((user.id, create_new_resume(user, db.session)))
+        db.session.commit()
+        db.engine.dispose()
+    return resumes
+
+
+def autosave(app: Flask, user_id: int, resume_id: int, saves: int, barrier, results):
+    outcomes = Counter()
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        payload = get_full_resume(resume_id, user, db.session).json()
+        db.session.rollback()
+        barrier.wait()
+        for i in range(saves):
+            payload["resume_name"] = f"Autosave {i}"
+            for section in payload["sections"]:
+                for item in section["items"]:
+                    item["description"] = f"Edit {i}"
+            try:
+                resume = get_full_resume(resume_id, user, db.session)
+                process_resume_update(resume, payload, db.session)
+                mark_resume_changed(resume_id, user, db.session)
+                db.session.commit()
+                outcomes["saved"] += 1
+            except OperationalError as e:
+                db.session.rollback()
+                outcomes[str(e.orig)] += 1
+    results.put(outcomes)
+
+
+def run_process(database_url, writers, saves, barrier, results, sqlite_defaults):
+    if sqlite_defaults:
+        event.remove(Engine, "connect", db_module._configure_sqlite)
+    app = make_app(database_url)
+    threads = [
+        Thread(target=autosave, args=(app, *writer, saves, barrier, results))
+        for writer in writers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="writers per process")
+    parser.add_argument("--saves", type=int, default=20, help="per writer")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--sqlite-defaults", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_url = args.database_url or f"sqlite:///{tmpdir}/benchmark.sqlite"
+        resumes = seed(database_url, args.processes * args.threads)
+
+        ctx = multiprocessing.get_context("fork")
+        barrier = ctx.Barrier(args.processes * args.threads + 1)
+        results = ctx.Queue()
+        children = [
+            ctx.Process(
+                target=run_process,
+                args=(
+                    database_url,
+                    resumes[p * args.threads : (p + 1) * args.threads],
+                    args.saves,
+                    barrier,
+                    results,
+                    args.sqlite_defaults,
+                ),
+            )
+            for p in range(args.processes)
+        ]
+        for child in children:
+            child.start()
+        barrier.wait()
+        start = time.monotonic()
+        outcomes = Counter()
+        for _ in resumes:
+            outcomes += results.get()
+        elapsed = time.monotonic() - start
+        for child in children:
+            child.join()
+
+    total = sum(outcomes.values())
+    print(
+        f"{args.processes} processes x {args.threads} threads, {total} saves "
+        f"in {elapsed:.2f}s ({outcomes['saved'] / elapsed:.1f} saved/s)"
+    )
+    for outcome, count in outcomes.most_common():
+        print(f"{count:>8}  {outcome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Resume update benchmark: full edits of resumes with a growing number of items
+are saved the way PUT /resume/update/<id> saves them, and the statements they
+take and the time they take are reported per resume size.
+
+    python benchmarks/resume_update.py
+    python benchmarks/resume_update.py --items 50 200 800 3200 --database-url postgresql://...
+
+Every item is edited, the items of each section are reversed, one item per
+section is removed and one added, and a section is renamed. A --database-url
+must point at a scratch database, the benchmark's tables and rows stay in it.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import event
+
+# Run from api/ or anywhere else, the API's modules are imported from api/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import db  # noqa: E402
+from controllers.resume import (  # noqa: E402
+    create_new_resume,
+    get_full_resume,
+    mark_resume_changed,
+    process_resume_update,
+)
+from models.rating import ResumeRating  # noqa: E402, F401
+from models.template import Template  # noqa: E402
+from models.user import User  # noqa: E402
+
+WRITES = ("INSERT", "UPDATE", "DELETE")
+
+
+def make_app(database_url: str, statements: list) -> Flask:
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        event.listen(
+            db.engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement),
+        )
+    return app
+
+
+def save(resume_id: int, user: User, payload: dict) -> dict:
+    # As update_resume does, without the version check and the response
+    resume = get_full_resume(resume_id, user, db.session)
+    process_resume_update(resume, payload, db.session)
+    _, snapshot = mark_resume_changed(resume_id, user, db.session)
+    db.session.commit()
+    return json.loads(snapshot)
+
+
+def with_items(payload: dict, items: int) -> dict:
+    # Spreads the items over the sections, as new items
+    per_section, rest = divmod(items, len(payload["sections"]))
+    for index, section in enumerate(payload["sections"]):
+        base = section["items"][0]
+        count = max(per_section + (index < rest), 1)
+        section["items"] = [
+            dict(base, id=None, title=f"Item {i}") for i in range(count)
+        ]
+    return payload
+
+
+def full_edit(payload: dict, run: int) -> dict:
+    for section in payload["sections"]:
+        for item in section["items"]:
+            item["description"] = f"Edited {run}"
+        section["items"].reverse()
+        section["items"].pop()
+        section["items"].append(dict(section["items"][0], id=None, title="New"))
+    payload["sections"][0]["name"] = f"Renamed {run}"
+    return payload
+
+
+def measure(app: Flask, statements: list, items: int, runs: int):
+    with app.app_context():
+        user = db.session.get(User, 1)
+        resume_id = create_new_resume(user, db.session)
+        db.session.commit()
+        payload = save(
+            resume_id,
+            user,
+            with_items(get_full_resume(resume_id, user, db.session).json(), items),
+        )
+
+        counts, writes, timings = [], [], []
+        for run in range(runs):
+            payload = full_edit(payload, run)
+            db.session.expire_all()
+            statements.clear()
+            start = time.perf_counter()
+            payload = save(resume_id, user, payload)
+            timings.append(time.perf_counter() - start)
+            counts.append(len(statements))
+            writes.append(
+                sum(s.lstrip().upper().startswith(WRITES) for s in statements)
+            )
+        db.session.remove()
+
+    saved = sum(len(section["items"]) for section in payload["sections"])
+    return saved, max(counts), max(writes), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--runs", type=int, default=5, help="edits per resume size")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_url = args.database_url or f"sqlite:///{tmpdir}/benchmark.sqlite"
+        statements = []
+        app = make_app(database_url, statements)
+        with app.app_context():
+            db.session.add(Template(id=1, name="Default", uri=""))
+            db.session.add(
+                User(google_id="benchmark", name="B", email="b@x", profile_picture="")
+            )
+            db.session.commit()
+
+        print(f"{'items':>8}{'statements':>12}{'writes':>8}{'ms':>10}")
+        for items in args.items:
+            saved, count, writes, elapsed = measure(app, statements, items, args.runs)
+            print(f"{saved:>8}{count:>12}{writes:>8}{elapsed * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
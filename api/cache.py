@@ -1,14 +1,211 @@
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 from functools import wraps
 from flask_caching import Cache
-from flask import current_app, request
+from flask_caching.backends.rediscache import RedisCache
+from flask import make_response, request
 from flask_login import current_user
-from threading import Lock
+from redis.exceptions import WatchError
+from threading import Event, Lock, Thread
+
+# Shared Redis used for the second cache tier, unset for an in-process only cache
+REDIS_URL = os.environ.get("REDIS_URL")
 
 # Cache singleton
 cache = None
 
-# cache mutex
-mu = Lock()
+# Longest time (seconds) a request waits for another request to fill the cache
+SINGLE_FLIGHT_TIMEOUT = 5
+# Lifetime (seconds) of the cross-process lock held while filling the cache
+SINGLE_FLIGHT_LOCK_TIMEOUT = 10
+# Delay (seconds) between cache checks while another process fills the cache
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+# In-process cache fills in progress, cache key -> event set once filled
+_flights = {}
+_flights_mu = Lock()
+
+
+class TwoTierCache(RedisCache):
+    """
+    Redis cache shared by every API process, fronted by a small in-process
+    LRU. Writes and deletes are broadcast over Redis pub/sub so that every
+    process drops its stale in-process copy.
+    """
+
+    INVALIDATION_CHANNEL = "cache_invalidation"
+
+    def __init__(
+        self, *args, l1_max_entries: int = 1024, l1_timeout: int = 30, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self._l1 = OrderedDict()  # key -> (expires at, serialized value)
+        self._l1_lock = Lock()
+        # Bumped by every local write and invalidation, so that a value read from
+        # Redis before one of them isn't put in the in-process tier after it
+        self._l1_epoch = 0
+        self._l1_max_entries = l1_max_entries
+        self._l1_timeout = l1_timeout
+        self._instance_id = uuid.uuid4().hex
+        self._listener_pid = None
+        self._listener_lock = Lock()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            l1_max_entries=config.get("CACHE_L1_MAX_ENTRIES", 1024),
+            l1_timeout=config.get("CACHE_L1_TIMEOUT", 30),
+        )
+        return super().factory(app, config, args, kwargs)
+
+    # --- In-process tier ---
+
+    def _l1_get(self, key: str) -> bytes | None:
+        with self._l1_lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry[1]
+
+    def _l1_set(self, key: str, dump: bytes, epoch: int | None = None):
+        # Values read from Redis are only kept if nothing was written or
+        # invalidated since the read started (epoch); written values always are
+        with self._l1_lock:
+            if epoch is None:
+                self._l1_epoch += 1
+            elif epoch != self._l1_epoch:
+                return
+            self._l1[key] = (time.monotonic() + self._l1_timeout, dump)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_clear(self):
+        with self._l1_lock:
+            self._l1_epoch += 1
+            self._l1.clear()
+
+    def _l1_delete(self, *keys: str):
+        with self._l1_lock:
+            self._l1_epoch += 1
+            for key in keys:
+                self._l1.pop(key, None)
+
+    # --- Invalidation broadcast ---
+
+    def _publish(self, *keys: str):
+        for key in keys:
+            self._write_client.publish(
+                self.INVALIDATION_CHANNEL, f"{self._instance_id}|{key}"
+            )
+
+    def _ensure_listener(self):
+        # Started lazily, and again after a fork, since threads do not survive forking
+        if self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            # Concurrent first requests of a process start a single listener
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._read_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.INVALIDATION_CHANNEL)
+                # Invalidations may have been missed while not subscribed
+                self._l1_clear()
+                for message in pubsub.listen():
+                    instance_id, _, key = message["data"].decode("utf-8").partition("|")
+                    if instance_id == self._instance_id:
+                        continue
+                    if key == "*":
+                        self._l1_clear()
+                    else:
+                        self._l1_delete(key)
+            except Exception:
+                time.sleep(1)
+
+    # --- Cache API ---
+
+    def get(self, key: str):
+        self._ensure_listener()
+        dump = self._l1_get(key)
+        if dump is None:
+            epoch = self._l1_epoch
+            dump = self._read_client.get(f"{self._get_prefix()}{key}")
+            if dump is None:
+                return None
+            self._l1_set(key, dump, epoch)
+        return self.serializer.loads(dump)
+
+    def get_many(self, *keys: str) -> list:
+        return [self.get(key) for key in keys]
+
+    def has(self, key: str) -> bool:
+        return self._l1_get(key) is not None or super().has(key)
+
+    def set(self, key: str, value, timeout: int | None = None):
+        self._ensure_listener()
+        dump = self.serializer.dumps(value)
+        timeout = self._normalize_timeout(timeout)
+        result = self._write_client.set(
+            name=f"{self._get_prefix()}{key}",
+            value=dump,
+            ex=timeout if timeout != -1 else None,
+        )
+        self._l1_set(key, dump)
+        self._publish(key)
+        return result
+
+    def set_many(self, mapping, timeout: int | None = None):
+        return [key for key, value in mapping.items() if self.set(key, value, timeout)]
+
+    def add(self, key: str, value, timeout: int | None = None):
+        created = super().add(key, value, timeout)
+        if created:
+            self._l1_delete(key)
+            self._publish(key)
+        return created
+
+    def delete(self, key: str):
+        result = super().delete(key)
+        self._l1_delete(key)
+        self._publish(key)
+        return result
+
+    def delete_many(self, *keys: str):
+        result = super().delete_many(*keys)
+        self._l1_delete(*keys)
+        self._publish(*keys)
+        return result
+
+    def inc(self, key: str, delta: int = 1):
+        result = super().inc(key, delta)
+        self._l1_delete(key)
+        self._publish(key)
+        return result
+
+    def dec(self, key: str, delta: int = 1):
+        result = super().dec(key, delta)
+        self._l1_delete(key)
+        self._publish(key)
+        return result
+
+    def clear(self):
+        result = super().clear()
+        self._l1_clear()
+        self._publish("*")
+        return result
 
 
 # Initialize the cache
@@ -19,78 +216,226 @@ def init_cache(app):
     if cache:
         return
 
-    cache = Cache(
-        app,
-        config={
-            "CACHE_TYPE": "FileSystemCache",
-            "CACHE_DIR": "/tmp/flask_cache",
-            "CACHE_DEFAULT_TIMEOUT": 60,
-            "CACHE_THRESHOLD": 1000,
-            "CACHE_MODE": 0o600,
-        },
-    )
+    if REDIS_URL:
+        config = {
+            "CACHE_TYPE": "cache.TwoTierCache",
+            "CACHE_REDIS_URL": REDIS_URL,
+            "CACHE_KEY_PREFIX": "prolio:",
+            "CACHE_L1_MAX_ENTRIES": 1024,
+            "CACHE_L1_TIMEOUT": 30,
+        }
+    else:
+        # Local development without Redis
+        config = {"CACHE_TYPE": "SimpleCache", "CACHE_THRESHOLD": 1000}
+
+    # Entries are invalidated on write, so the timeout only bounds memory use
+    cache = Cache(app, config={**config, "CACHE_DEFAULT_TIMEOUT": 3600})
+
 
+# Read a value straight from the cache singleton
+def get_cached_value(key: str):
+    return cache.get(key)
 
-# Cache key based on current user and request path
-def make_cache_key(path: str = None) -> str:
-    if not path:
-        with current_app.app_context():
-            path = request.path
 
+# Write a value straight to the cache singleton
+def set_cached_value(key: str, value, timeout: int | None = None):
+    cache.set(key, value, timeout=timeout)
+
+
+# Write a value unless the key is already set, returns whether it was written
+def add_cached_value(key: str, value, timeout: int | None = None) -> bool:
+    return cache.add(key, value, timeout=timeout)
+
+
+# Delete a value straight from the cache singleton
+def delete_cached_value(key: str):
+    cache.delete(key)
+
+
+GENERATION_KEY = "cache_generation"
+
+# Generations when the cache isn't Redis backed (a single process). They can't
+# live in SimpleCache, which would expire or prune them and so bring older
+# generations, and the entries still cached under them, back into use.
+_local_generations = {}
+_local_generations_mu = Lock()
+
+
+# Current cache generation of a user, bumped to invalidate all of their entries
+def get_generation(user_id) -> int:
+    if not isinstance(cache.cache, RedisCache):
+        return _local_generations.get(user_id, 0)
+    return cache.get(f"{GENERATION_KEY}:{user_id}") or 0
+
+
+# Cache key based on current user, their cache generation and request path
+# (including the query string)
+def make_cache_key() -> str:
     # Build a unique cache key per user and path
     user_id = current_user.id if current_user.is_authenticated else "anon"
-    key = f"response_cache:{user_id}:{path}"
+    key = f"response_cache:{user_id}:g{get_generation(user_id)}:{request.full_path}"
     return key
 
 
-CACHED_ROUTES_KEY = "cached_routes"
+# Wait up to the single flight timeout for another request to fill the cache
+def _wait_for_fill(key: str, event: Event | None = None):
+    if event:
+        event.wait(SINGLE_FLIGHT_TIMEOUT)
+        return cache.get(key)
+
+    deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        result = cache.get(key)
+        if result is not None:
+            return result
+    return None
+
+
+# Compute and cache a value, making sure only one caller (across threads and
+# processes) computes it at a time while the others wait for the result
+def _single_flight(key: str, compute):
+    with _flights_mu:
+        event = _flights.get(key)
+        leader = event is None
+        if leader:
+            event = _flights[key] = Event()
+
+    if not leader:
+        result = _wait_for_fill(key, event)
+        # Fall back to computing it ourselves if the leader failed or timed out
+        return result if result is not None else compute()
+
+    lock_key = f"lock:{key}"
+    try:
+        if not cache.add(lock_key, 1, timeout=SINGLE_FLIGHT_LOCK_TIMEOUT):
+            # Another process is filling the cache
+            result = _wait_for_fill(key)
+            if result is not None:
+                return result
+            return compute()
+
+        try:
+            result = compute()
+            cache.set(key, result)
+        finally:
+            cache.delete(lock_key)
+        return result
+    finally:
+        with _flights_mu:
+            _flights.pop(key, None)
+        event.set()
+
+
+# Hold a lock shared by every API process (through the cache) while running a block
+@contextmanager
+def cache_lock(name: str, timeout: int = SINGLE_FLIGHT_LOCK_TIMEOUT):
+    lock_key = f"lock:{name}"
+    deadline = time.monotonic() + timeout
+    while not cache.add(lock_key, 1, timeout=timeout):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for lock {name}")
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+SLOTS_KEY = "slots"
+
+# Slots when the cache isn't Redis backed (a single process), name -> {token:
+# expires at}
+_local_slots = {}
+_local_slots_mu = Lock()
 
 
-# Keep track of cached routes for garbage collection
-# Precondition: caller has acquired the mutex
-def cache_route(path: str):
-    val = cache.get(f"{CACHED_ROUTES_KEY}:{current_user.id}")
-    if not val:
-        val = set()
-    val.add(path)
-    cache.set(f"{CACHED_ROUTES_KEY}:{current_user.id}", val)
+# Take one of `limit` slots shared by every API process (a counting semaphore).
+# A slot is held until released, or for `timeout` seconds in case its holder
+# goes away. Returns the token to release it with, or None if all are taken.
+def acquire_slot(name: str, limit: int, timeout: int) -> str | None:
+    token = uuid.uuid4().hex
+    now = time.time()
+    if not isinstance(cache.cache, RedisCache):
+        with _local_slots_mu:
+            slots = _local_slots.setdefault(name, {})
+            for held, expires in list(slots.items()):
+                if expires <= now:
+                    del slots[held]
+            if len(slots) >= limit:
+                return None
+            slots[token] = now + timeout
+        return token
+
+    # Holders in a sorted set scored by expiry, taken in a transaction that is
+    # retried if another process changed the set in the meantime
+    key = f"{cache.cache._get_prefix()}{SLOTS_KEY}:{name}"
+    with cache.cache._write_client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                if pipe.zcount(key, now, "+inf") >= limit:
+                    pipe.unwatch()
+                    return None
+                pipe.multi()
+                pipe.zremrangebyscore(key, "-inf", now)
+                pipe.zadd(key, {token: now + timeout})
+                pipe.expire(key, timeout)
+                pipe.execute()
+                return token
+            except WatchError:
+                continue
+
+
+# Give back a slot taken with acquire_slot
+def release_slot(name: str, token: str):
+    if not isinstance(cache.cache, RedisCache):
+        with _local_slots_mu:
+            _local_slots.get(name, {}).pop(token, None)
+        return
+    cache.cache._write_client.zrem(
+        f"{cache.cache._get_prefix()}{SLOTS_KEY}:{name}", token
+    )
 
 
 # Custom decorator to cache responses
 def cache_response(fn):
-    mu.acquire()
-
     @wraps(fn)
     def wrapper(*args, **kwargs):
         key = make_cache_key()
 
-        # Try to get cached result
-        cached_result = cache.get(key)
-        if cached_result is not None:
-            return cached_result
-
-        # Otherwise, call the function and cache the result
-        result = fn(*args, **kwargs)
-        cache.set(key, result)
+        # Try to get cached result, otherwise call the function and cache the result
+        result = cache.get(key)
+        if result is None:
+            result = _single_flight(key, lambda: fn(*args, **kwargs))
 
-        with current_app.app_context():
-            cache_route(request.path)
-
-        return result
+        # Answer If-None-Match with 304 Not Modified when the response has an ETag
+        return make_response(result).make_conditional(request)
 
-    mu.release()
     return wrapper
 
 
-# Delete all cache entries for a user
-def invalidate_cache():
-    mu.acquire()
+# Invalidate all cache entries for a user by bumping their cache generation.
+# Entries of older generations are never read again and simply expire.
+def invalidate_cache(user_id=None):
+    if user_id is None:
+        user_id = current_user.id
+    if not isinstance(cache.cache, RedisCache):
+        with _local_generations_mu:
+            _local_generations[user_id] = _local_generations.get(user_id, 0) + 1
+        return
+    # Cache does not proxy inc, so go to the backend for an atomic increment.
+    # Redis keys set by INCR don't expire.
+    cache.cache.inc(f"{GENERATION_KEY}:{user_id}")
 
-    cached_routes = cache.get(f"{CACHED_ROUTES_KEY}:{current_user.id}") or set()
-    for route in cached_routes:
-        key = make_cache_key(route)
-        cache.delete(key)
 
-    cache.delete(f"{CACHED_ROUTES_KEY}:{current_user.id}")
+# Decorator invalidating the current user's cache entries after a write
+def invalidates_cache(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            invalidate_cache()
 
-    mu.release()
+    return wrapper
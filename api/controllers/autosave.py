@@ -0,0 +1,237 @@
+import math
+import os
+from threading import Timer
+
+from flask import current_app, request
+from flask_login import current_user
+
+from cache import (
+    add_cached_value,
+    cache_lock,
+    delete_cached_value,
+    get_cached_value,
+    invalidate_cache,
+    set_cached_value,
+)
+from db import db
+from controllers.resume import (
+    get_full_resume,
+    get_resume_version,
+    mark_resume_changed,
+    process_resume_update,
+    validate_resume_payload,
+)
+from models.user import User
+
+# Window (seconds) in which full resume updates of a resume are coalesced into
+# a single write. Coalescing is disabled when unset or 0.
+AUTOSAVE_COALESCE = float(os.environ.get("AUTOSAVE_COALESCE") or 0)
+
+# Pending update of a resume, resume id -> latest payload and versions
+PENDING_UPDATE_KEY = "pending_resume_update"
+# Ids of the resumes of a user with a pending update
+PENDING_INDEX_KEY = "pending_resume_updates"
+# Pending updates outlive their window in case the process that would have
+# written them goes away, they are then written by the next request of the user
+PENDING_UPDATE_TIMEOUT = 3600
+# Set while a flush of a user's pending updates is scheduled, it outlives the
+# window only briefly in case the process that scheduled it goes away
+FLUSH_SCHEDULED_KEY = "pending_resume_flush"
+
+
+def wants_coalescing() -> bool:
+    """
+    Whether the current request is a full resume update that opted in to being
+    coalesced with `Prefer: respond-async`.
+    """
+    return (
+        AUTOSAVE_COALESCE > 0
+        and request.method == "PUT"
+        and "respond-async" in request.headers.get("Prefer", "")
+    )
+
+
+def _lock_name(user_id: int) -> str:
+    return f"{PENDING_INDEX_KEY}:{user_id}"
+
+
+def get_effective_version(resume_id: int, user: User, db_session) -> int | None:
+    """
+    Version of a resume including its pending update, if any.
+    """
+    pending = get_cached_value(f"{PENDING_UPDATE_KEY}:{resume_id}")
+    if pending and pending["user_id"] == user.id:
+        return pending["version"]
+    return get_resume_version(resume_id, user, db_session)
+
+
+def buffer_resume_update(
+    resume_id: int,
+    user: User,
+    payload: dict,
+    db_session,
+    expected_version: int | None = None,
+) -> int | None:
+    """
+    Buffers a full resume update to be written together with the ones that follow
+    it within the coalescing window. Returns the version the resume will have once
+    written, or None if the resume was not found or is no longer at expected_version.
+    Raises ValueError for an invalid payload, which is checked right away since it
+    can't be reported later.
+    """
+    validate_resume_payload(payload)
+
+    with cache_lock(_lock_name(user.id)):
+        key = f"{PENDING_UPDATE_KEY}:{resume_id}"
+        pending = get_cached_value(key)
+        if pending and pending["user_id"] == user.id:
+            base_version, version = pending["base_version"], pending["version"]
+        else:
+            pending = None
+            base_version = version = get_resume_version(resume_id, user, db_session)
+            if version is None:
+                return None
+        if expected_version is not None and version != expected_version:
+            return None
+
+        # Updates carry the whole resume, so the latest one supersedes the others
+        set_cached_value(
+            key,
+            {
+                "user_id": user.id,
+                "payload": payload,
+                "base_version": base_version,
+                "version": version + 1,
+            },
+            timeout=PENDING_UPDATE_TIMEOUT,
+        )
+        if not pending:
+            index = get_cached_value(f"{PENDING_INDEX_KEY}:{user.id}") or []
+            set_cached_value(
+                f"{PENDING_INDEX_KEY}:{user.id}",
+                [*index, resume_id],
+                timeout=PENDING_UPDATE_TIMEOUT,
+            )
+
+    _schedule_flush(user.id)
+    return version + 1
+
+
+def _schedule_flush(user_id: int):
+    """
+    Flushes the user's pending updates once the coalescing window is over, unless
+    a flush is already scheduled.
+    """
+    if not add_cached_value(
+        f"{FLUSH_SCHEDULED_KEY}:{user_id}",
+        1,
+        timeout=math.ceil(AUTOSAVE_COALESCE) + 1,
+    ):
+        return
+    timer = Timer(
+        AUTOSAVE_COALESCE,
+        _flush_later,
+        args=(current_app._get_current_object(), user_id),
+    )
+    timer.daemon = True
+    timer.start()
+
+
+def flush_resume_updates(user: User, db_session):
+    """
+    Writes the pending updates of a user's resumes, each in its own transaction.
+    """
+    index_key = f"{PENDING_INDEX_KEY}:{user.id}"
+    if not get_cached_value(index_key):
+        return
+
+    with cache_lock(_lock_name(user.id)):
+        retry = []
+        for resume_id in get_cached_value(index_key) or []:
+            key = f"{PENDING_UPDATE_KEY}:{resume_id}"
+            pending = get_cached_value(key)
+            if pending and not _write_pending_update(
+                resume_id, user, pending, db_session
+            ):
+                # Keep the acknowledged update for the next flush to retry, it
+                # is only lost once it times out
+                retry.append(resume_id)
+                continue
+            delete_cached_value(key)
+        if retry:
+            set_cached_value(index_key, retry, timeout=PENDING_UPDATE_TIMEOUT)
+        else:
+            delete_cached_value(index_key)
+    invalidate_cache(user.id)
+    if retry:
+        _schedule_flush(user.id)
+
+
+def _write_pending_update(
+    resume_id: int, user: User, pending: dict, db_session
+) -> bool:
+    """
+    Writes a pending update. Returns False if it could not be written and should
+    be retried, True if it was written or dropped because the resume changed.
+    """
+    try:
+        resume = get_full_resume(resume_id, user, db_session)
+        if resume:
+            process_resume_update(resume, pending["payload"], db_session)
+            # Versions acknowledged for the coalesced updates are skipped over
+            if mark_resume_changed(
+                resume_id,
+                user,
+                db_session,
+                expected_version=pending["base_version"],
+                to_version=pending["version"],
+            ):
+                db_session.commit()
+                return True
+        current_app.logger.warning(
+            f"Dropping pending update of resume {resume_id}, it changed in the meantime"
+        )
+        db_session.rollback()
+        return True
+    except Exception as e:
+        db_session.rollback()
+        current_app.logger.error(
+            f"Could not write pending update of resume {resume_id}, "
+            f"keeping it to retry: {e}"
+        )
+        return False
+
+
+def _flush_later(app, user_id: int):
+    with app.app_context():
+        # Updates buffered from now on need a flush of their own
+        delete_cached_value(f"{FLUSH_SCHEDULED_KEY}:{user_id}")
+        user = db.session.get(User, user_id)
+        if not user:
+            return
+        try:
+            flush_resume_updates(user, db.session)
+        except TimeoutError:
+            # Another process holds the lock and is flushing the updates
+            current_app.logger.warning(
+                f"Could not flush pending updates of user {user_id}, lock is held"
+            )
+
+
+def flush_before_request():
+    """
+    Writes the current user's pending resume updates before any other request of
+    theirs is handled, so that they always read their own writes.
+    """
+    if AUTOSAVE_COALESCE <= 0 or wants_coalescing():
+        return
+    if current_user.is_authenticated:
+        try:
+            flush_resume_updates(current_user, db.session)
+        except TimeoutError:
+            # The updates are being written by another process that is taking
+            # longer than the lock wait, don't fail the request over it
+            current_app.logger.warning(
+                f"Could not flush pending updates of user {current_user.id}, "
+                "lock is held"
+            )
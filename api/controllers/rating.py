@@ -0,0 +1,77 @@
+import hashlib
+import json
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from models.rating import ResumeRating
+
+# Fields of a resume that don't change how it reads, left out of what is rated
+UNRATED_FIELDS = {
+    "id",
+    "user_id",
+    "resume_id",
+    "section_id",
+    "template_id",
+    "resume_name",
+    "created_at",
+    "updated_at",
+    "version",
+    "display_order",
+}
+
+
+def rating_content(resume_json: dict) -> dict:
+    """
+    Normalizes a resume's json() into the content that is rated: ids, timestamps
+    and other bookkeeping are dropped (sections and items stay in display order)
+    and text is stripped, so that resumes reading the same rate the same.
+    """
+
+    def normalize(value):
+        if isinstance(value, dict):
+            return {
+                k: normalize(v) for k, v in value.items() if k not in UNRATED_FIELDS
+            }
+        elif isinstance(value, list):
+            return [normalize(v) for v in value]
+        elif isinstance(value, str):
+            return value.strip()
+        return value
+
+    return normalize(resume_json)
+
+
+def rating_key(content: dict, *prompt) -> str:
+    """
+    Hash identifying a rating of the given content, prompt and model, any change
+    to one of them makes for a new rating.
+    """
+    return hashlib.sha256(
+        json.dumps([content, *prompt], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def get_rating(content_hash: str, db_session) -> dict | None:
+    rating = db_session.execute(
+        select(ResumeRating).filter_by(content_hash=content_hash)
+    ).scalar()
+    return rating.json() if rating else None
+
+
+def save_rating(content_hash: str, result: dict, db_session):
+    """
+    Stores a rating. Ratings of the same content stored concurrently are kept
+    once, whichever comes first.
+    """
+    db_session.add(
+        ResumeRating(
+            content_hash=content_hash,
+            rating=result["rating"],
+            reasoning=result["reasoning"],
+        )
+    )
+    try:
+        db_session.commit()
+    except IntegrityError:
+        db_session.rollback()
@@ -1,5 +1,18 @@
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+import json
+from functools import lru_cache
+
+from sqlalchemy import (
+    and_,
+    bindparam,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.orm import aliased, selectinload
 
 from flask import current_app
 
@@ -72,80 +85,28 @@ def _parse_item_data(item_payload: dict, user_id: int) -> dict | None:
     return parsed_data
 
 
-def _find_or_create_item(
-    item_payload: dict, user_id: int, section_id: int, display_order: int, db_session
-) -> ResumeItem | None:
+def _find_existing(payload: dict, existing: dict, kind: str):
     """
-    Finds an existing ResumeItem by ID or creates a new one for the given section.
-    It ensures the item belongs to the current user and section if an ID is provided.
+    Returns the already loaded object the payload refers to by ID, or None if it
+    refers to nothing of this resume (new, client-side or foreign IDs).
     """
-    item_id = item_payload.get("id")
-    item = None
-
-    if item_id is not None:
-        try:
-            item_id = int(item_id)
-            stmt = select(ResumeItem).where(
-                ResumeItem.id == item_id,
-                ResumeItem.user_id == user_id,
-                ResumeItem.section_id
-                == section_id,  # Item must belong to the section being processed
-            )
-            item = db_session.execute(stmt).scalar_one_or_none()
-            # If item is not found, we fall through and create a new one below.
-        except (ValueError, TypeError):
-            # If item_id is not a valid integer (e.g., a client-side UUID), treat as a new item.
-            item = None
-            current_app.logger.info(
-                f"Warning: Invalid item_id format: {item_payload.get('id')}. Treating as new item."
-            )
-
-    parsed_data = _parse_item_data(item_payload, user_id)
-    if not parsed_data:
+    payload_id = payload.get("id")
+    if payload_id is None:
+        return None
+    try:
+        return existing.get(int(payload_id))
+    except (ValueError, TypeError):
+        # If the id is not a valid integer (e.g., a client-side UUID), treat as new.
+        current_app.logger.info(
+            f"Warning: Invalid {kind}_id format: {payload_id}. Treating as new {kind}."
+        )
         return None
 
-    if item:  # Existing item found, update it
-        for key, value in parsed_data.items():
-            setattr(item, key, value)
-        item.display_order = display_order  # Always update display order
-    else:  # New item
-        item = ResumeItem()
-        for key, value in parsed_data.items():
-            setattr(item, key, value)
-        item.user_id = user_id
-        item.section_id = section_id
-        item.display_order = display_order
-        db_session.add(item)
-    return item
-
-
-def _find_or_create_section(
-    section_payload: dict, resume_id: int, user_id: int, display_order: int, db_session
-) -> ResumeSection | None:
-    """
-    Finds an existing ResumeSection by ID or creates a new one for the given resume and user.
-    Updates display_order for both existing and new sections.
-    """
-    section_id = section_payload.get("id")
-    section = None
-
-    if section_id is not None:
-        try:
-            section_id = int(section_id)
-            stmt = select(ResumeSection).where(
-                ResumeSection.id == section_id,
-                ResumeSection.user_id == user_id,
-                ResumeSection.resume_id == resume_id,
-            )
-            section = db_session.execute(stmt).scalar_one_or_none()
-            # If section is not found, we fall through to create a new one below.
-        except (ValueError, TypeError):
-            # If section_id is not a valid int, treat as a new section.
-            section = None
-            current_app.logger.info(
-                f"Warning: Invalid section_id format: {section_payload.get('id')}. Treating as new section."
-            )
 
+def _parse_section_data(section_payload: dict) -> dict | None:
+    """
+    Parses and validates section payload data. Returns a dictionary of parsed data or None if validation fails.
+    """
     section_type_input = section_payload.get("type") or section_payload.get(
         "section_type"
     )
@@ -162,56 +123,62 @@ def _find_or_create_section(
         current_app.logger.info("Warning: Missing name for section.")
         return None
 
-    if section:  # Existing section, update it
-        section.name = name
-        section.section_type = section_type_val
-        section.display_order = display_order
-    else:  # New section
-        section = ResumeSection()
-        section.user_id = user_id
-        section.resume_id = resume_id
-        section.name = name
-        section.section_type = section_type_val
-        section.display_order = display_order
-        db_session.add(section)
-        db_session.flush()  # Ensure ID is available for item processing
-    return section
-
-
-def _update_section_items(
-    section_db: ResumeSection, items_payload: list[dict], user_id: int, db_session
-):
-    """
-    Synchronizes the items of a given section with the payload using a one-to-many relationship.
-    Creates, updates, or deletes items as needed. Manages item order within the section.
-    """
-    # By replacing the collection, SQLAlchemy's delete-orphan cascade handles deletions.
-    updated_items_collection = []
-    for item_idx, item_data_payload in enumerate(items_payload):
-        # We now pass the section_id and display_order directly
-        item_db = _find_or_create_item(
-            item_data_payload, user_id, section_db.id, item_idx, db_session
-        )
-        if not item_db:
+    return {"name": name, "section_type": section_type_val}
+
+
+def _has_changes(obj, values: dict) -> bool:
+    for key, value in values.items():
+        current = getattr(obj, key)
+        if isinstance(current, datetime) and current.tzinfo is None:
+            # SQLite hands timezone-aware columns back naive, they are stored in UTC
+            current = current.replace(tzinfo=timezone.utc)
+        if current != value:
+            return True
+    return False
+
+
+def _diff_section_items(
+    items_payload: list[dict], existing_items: dict[int, ResumeItem], user_id: int
+) -> tuple[list[dict], list[dict], set[int]]:
+    """
+    Compares the items payload of a section against its loaded items.
+    Returns the rows to insert (without section_id), the rows to update and
+    the IDs of the existing items that are kept. Manages item order within the section.
+    """
+    inserts, updates, kept_ids = [], [], set()
+    for item_idx, item_payload in enumerate(items_payload):
+        parsed_data = _parse_item_data(item_payload, user_id)
+        if not parsed_data:
             current_app.logger.info(
-                f"Skipping item due to creation/find failure: {item_data_payload.get('title')}"
+                f"Skipping item due to validation failure: {item_payload.get('title')}"
             )
-            # Potentially raise an error here to abort the transaction
             continue
-        updated_items_collection.append(item_db)
+        parsed_data["display_order"] = item_idx
 
-    # This is the key change: assigning the new list to the relationship collection.
-    # SQLAlchemy will automatically detect which items are new (INSERT), which are removed (DELETE),
-    # and which are existing (and will be updated by the logic in _find_or_create_item).
-    section_db.items = updated_items_collection
+        item = _find_existing(item_payload, existing_items, "item")
+        if item and item.id not in kept_ids:
+            kept_ids.add(item.id)
+            if _has_changes(item, parsed_data):
+                updates.append({"id": item.id, **parsed_data})
+        else:
+            inserts.append({"user_id": user_id, **parsed_data})
+    return inserts, updates, kept_ids
 
 
-def process_resume_update(resume_db: Resume, payload: dict, db_session):
+def _mark_other_resumes_changed(user_id: int, resume_id: int, db_session):
+    # Contact fields are part of every resume of the user, so their other
+    # snapshots are cleared and rebuilt on their next read
+    db_session.execute(
+        update(Resume)
+        .where(Resume.user_id == user_id, Resume.id != resume_id)
+        .values(version=Resume.version + 1, snapshot=None)
+    )
+
+
+def validate_resume_payload(payload: dict):
     """
-    Main controller function to process updates to a resume, including its sections and items.
-    Updates are delegated to the user or resume object as appropriate.
+    Checks the structure of a full resume update payload, raising ValueError if invalid.
     """
-    # Validation Checks
     sections_payload = payload.get("sections", [])
 
     # Ensure all section types are present and there are no extras
@@ -236,6 +203,15 @@ def process_resume_update(resume_db: Resume, payload: dict, db_session):
                 f"Section '{section_name}' cannot be empty. Please add at least one item."
             )
 
+
+def process_resume_update(resume_db: Resume, payload: dict, db_session):
+    """
+    Main controller function to process updates to a resume, including its sections and items.
+    Updates are delegated to the user or resume object as appropriate.
+    """
+    validate_resume_payload(payload)
+    sections_payload = payload.get("sections", [])
+
     # Update User fields via the relationship
     user_to_update = resume_db.user
     user_to_update.name = payload.get("name", user_to_update.name)
@@ -245,186 +221,764 @@ def process_resume_update(resume_db: Resume, payload: dict, db_session):
     user_to_update.github = payload.get("github", user_to_update.github)
     user_to_update.website = payload.get("website", user_to_update.website)
 
+    if db_session.is_modified(user_to_update):
+        _mark_other_resumes_changed(user_to_update.id, resume_db.id, db_session)
+
     # Update Resume-specific fields
     resume_db.resume_name = payload.get("resume_name", resume_db.resume_name)
     if "template_id" in payload:
         resume_db.template_id = payload["template_id"]
 
     # Process Sections
-    sections_payload = payload.get("sections", [])
-    user_id = user_to_update.id  # Keep user_id for nested calls for simplicity
-
-    # Get current sections from DB for this resume to find orphans later
-    current_db_sections_stmt = select(ResumeSection.id).where(
-        ResumeSection.resume_id == resume_db.id
-    )
-    current_db_section_ids = {
-        s_id for (s_id,) in db_session.execute(current_db_sections_stmt).all()
-    }
-    processed_section_ids_in_payload = set()
-
-    for section_idx, section_data_payload in enumerate(sections_payload):
-        section_db = _find_or_create_section(
-            section_data_payload, resume_db.id, user_id, section_idx, db_session
-        )
-        if not section_db:
+    # The payload is diffed against the already loaded tree, and the changes are
+    # written with a fixed number of batched statements whatever the resume size.
+    user_id = user_to_update.id
+    existing_sections = {section.id: section for section in resume_db.sections}
+
+    section_inserts, section_updates = [], []
+    new_section_items = []  # items to insert for each of section_inserts
+    item_inserts, item_updates = [], []
+    kept_section_ids, orphan_item_ids = set(), []
+
+    for section_idx, section_payload in enumerate(sections_payload):
+        section_data = _parse_section_data(section_payload)
+        if not section_data:
             current_app.logger.info(
-                f"Skipping section due to creation/find failure: {section_data_payload.get('name')}"
+                f"Skipping section due to validation failure: {section_payload.get('name')}"
             )
-            continue  # Skip processing this section if it failed
+            continue
+        section_data["display_order"] = section_idx
 
-        processed_section_ids_in_payload.add(section_db.id)
+        section_db = _find_existing(section_payload, existing_sections, "section")
+        if section_db and section_db.id not in kept_section_ids:
+            kept_section_ids.add(section_db.id)
+            if _has_changes(section_db, section_data):
+                section_updates.append({"id": section_db.id, **section_data})
 
-        items_payload_for_section = section_data_payload.get("items", [])
-        _update_section_items(
-            section_db, items_payload_for_section, user_id, db_session
-        )
+            existing_items = {item.id: item for item in section_db.items}
+            inserts, updates, kept_item_ids = _diff_section_items(
+                section_payload.get("items", []), existing_items, user_id
+            )
+            item_inserts += [{**row, "section_id": section_db.id} for row in inserts]
+            item_updates += updates
+            orphan_item_ids += existing_items.keys() - kept_item_ids
+        else:
+            section_inserts.append(
+                {"user_id": user_id, "resume_id": resume_db.id, **section_data}
+            )
+            inserts, _, _ = _diff_section_items(
+                section_payload.get("items", []), {}, user_id
+            )
+            new_section_items.append(inserts)
 
-    # Delete Orphaned Sections (sections in DB but not in payload for this resume)
-    section_ids_to_delete = current_db_section_ids - processed_section_ids_in_payload
-    for sec_id_to_delete in section_ids_to_delete:
-        section_to_delete_stmt = select(ResumeSection).where(
-            ResumeSection.id == sec_id_to_delete,
-            ResumeSection.user_id == user_id,
-            ResumeSection.resume_id == resume_db.id,
+    # Orphaned sections (in DB but not in payload) are deleted with their items
+    orphan_section_ids = existing_sections.keys() - kept_section_ids
+    if orphan_section_ids:
+        current_app.logger.info(
+            f"Deleting orphaned section_ids {sorted(orphan_section_ids)} from resume_id {resume_db.id}"
         )
-        section_to_delete = db_session.execute(
-            section_to_delete_stmt
-        ).scalar_one_or_none()
-        if section_to_delete:
-            db_session.delete(
-                section_to_delete
-            )  # Cascading delete should handle its associations
-            current_app.logger.info(
-                f"Deleting orphaned section_id {sec_id_to_delete} from resume_id {resume_db.id}"
+
+    # The loaded objects are not kept in sync by these statements, the resume is
+    # reloaded afterwards (see refresh_resume_snapshot)
+    if orphan_item_ids or orphan_section_ids:
+        db_session.execute(
+            delete(ResumeItem)
+            .where(
+                or_(
+                    ResumeItem.id.in_(orphan_item_ids),
+                    ResumeItem.section_id.in_(orphan_section_ids),
+                )
             )
+            .execution_options(synchronize_session=False)
+        )
+    if orphan_section_ids:
+        db_session.execute(
+            delete(ResumeSection)
+            .where(ResumeSection.id.in_(orphan_section_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+    if section_updates:
+        db_session.execute(update(ResumeSection), section_updates)
+    if section_inserts:
+        # A payload may hold several sections of the same type, so new sections
+        # are matched back to their items by position in RETURNING
+        new_section_ids = db_session.scalars(
+            insert(ResumeSection).returning(
+                ResumeSection.id, sort_by_parameter_order=True
+            ),
+            section_inserts,
+        ).all()
+        for section_id, inserts in zip(new_section_ids, new_section_items):
+            item_inserts += [{**row, "section_id": section_id} for row in inserts]
+
+    if item_updates:
+        db_session.execute(update(ResumeItem), item_updates)
+    if item_inserts:
+        db_session.execute(insert(ResumeItem), item_inserts)
 
     # Save changes for resume scalars, new/updated sections, items, associations
     # The db_session.commit() will be handled in the view function after this returns.
     return resume_db
 
 
-def create_new_resume(user: User, db_session) -> Resume:
+# Default sections (in display order) and their default item, per section type
+DEFAULT_RESUME_SECTIONS = (
+    (
+        ResumeItemType.education,
+        {
+            "title": "Degree",
+            "organization": "University Name",
+            "description": "Degree description",
+        },
+    ),
+    (
+        ResumeItemType.experience,
+        {
+            "title": "Job Title",
+            "organization": "Company Name",
+            "description": "Job description",
+        },
+    ),
+    (
+        ResumeItemType.project,
+        {
+            "title": "Project Name",
+            "organization": "",
+            "description": "Project description",
+        },
+    ),
+    (
+        ResumeItemType.skill,
+        {
+            "title": "Skill Category",
+            "organization": "",
+            "description": "Resume-building, problem-solving, etc",
+        },
+    ),
+)
+
+
+@lru_cache
+def get_resume_skeleton(template_id: int) -> tuple[tuple[dict, dict], ...]:
     """
-    Creates a new resume, fully populated with default sections and a default item for each section.
+    Rows of the default sections and items of a new resume using a template,
+    built once per template. Every template currently shares the same skeleton.
     """
-    # Find a default template
+    return tuple(
+        (
+            {
+                "name": SECTION_TYPE_TO_DISPLAY_NAME_MAPPING[section_type],
+                "section_type": section_type,
+                "display_order": i,
+            },
+            {**item, "location": "", "end_date": None, "display_order": 0},
+        )
+        for i, (section_type, item) in enumerate(DEFAULT_RESUME_SECTIONS)
+    )
 
-    default_template = db_session.execute(
-        select(Template).limit(1)
-    ).scalar_one_or_none()
-    if not default_template:
-        # TODO: for future custom template support
-        # Create a default template
-        default_template = Template()
-        default_template.name = "Default Template"
-        default_template.uri = ""
-        db_session.add(default_template)
-        db_session.flush()
-        default_template = db_session.execute(
-            select(Template).limit(1)
-        ).scalar_one_or_none()
 
+def _get_default_template_id(db_session) -> int:
+    template_id = db_session.scalar(select(Template.id).limit(1))
+    if template_id is None:
+        # TODO: for future custom template support
         current_app.logger.info(
             "No templates found in the system. Creating a default template."
         )
+        template_id = db_session.scalar(
+            insert(Template)
+            .values(name="Default Template", uri="")
+            .returning(Template.id)
+        )
+    return template_id
+
 
-    # Generate a unique default name
-    base_name = "Untitled Resume"
-    existing_names_stmt = select(Resume.resume_name).where(
-        Resume.user_id == user.id, Resume.resume_name.like(f"{base_name}%")
+def _next_resume_name(user: User, db_session, base_name="Untitled Resume") -> str:
+    existing_names = set(
+        db_session.scalars(
+            select(Resume.resume_name).where(
+                Resume.user_id == user.id, Resume.resume_name.like(f"{base_name}%")
+            )
+        )
     )
-    existing_names = db_session.execute(existing_names_stmt).scalars().all()
-    new_name = base_name
-    counter = 1
-    while new_name in existing_names:
+    if base_name not in existing_names:
+        return base_name
+    counter = 2
+    while f"{base_name} ({counter})" in existing_names:
         counter += 1
-        new_name = f"{base_name} ({counter})"
+    return f"{base_name} ({counter})"
+
 
-    # Create the resume object
-    new_resume = Resume()
-    new_resume.user_id = user.id
-    new_resume.resume_name = new_name
-    new_resume.template_id = default_template.id
-    db_session.add(new_resume)
-    db_session.flush()  # Flush to get the new_resume.id
+def create_new_resume(user: User, db_session) -> int:
+    """
+    Creates a new resume, fully populated with default sections and a default item
+    for each section, with one multi-row insert per table. Returns its id.
+    """
+    template_id = _get_default_template_id(db_session)
+
+    resume_id = db_session.scalar(
+        insert(Resume)
+        .values(
+            user_id=user.id,
+            resume_name=_next_resume_name(user, db_session),
+            template_id=template_id,
+        )
+        .returning(Resume.id)
+    )
 
-    # Create a default section and item for each type
+    skeleton = get_resume_skeleton(template_id)
+    # The skeleton has one section per type, so sections are matched back by type
+    section_ids = dict(
+        db_session.execute(
+            insert(ResumeSection).returning(
+                ResumeSection.section_type, ResumeSection.id
+            ),
+            [
+                {**section, "user_id": user.id, "resume_id": resume_id}
+                for section, _ in skeleton
+            ],
+        ).all()
+    )
 
-    ordered_section_types = [
-        ResumeItemType.education,
-        ResumeItemType.experience,
-        ResumeItemType.project,
-        ResumeItemType.skill,
-    ]
+    now = datetime.now()
+    db_session.execute(
+        insert(ResumeItem),
+        [
+            {
+                **item,
+                "user_id": user.id,
+                "section_id": section_ids[section["section_type"]],
+                "start_date": now,
+            }
+            for section, item in skeleton
+        ],
+    )
+    return resume_id
 
-    for i, section_type in enumerate(ordered_section_types):
-        section_name = SECTION_TYPE_TO_DISPLAY_NAME_MAPPING[section_type]
-        new_section = ResumeSection()
-        new_section.user_id = user.id
-        new_section.resume_id = new_resume.id
-        new_section.name = section_name
-        new_section.section_type = section_type
-        new_section.display_order = i
-        db_session.add(new_section)
-        db_session.flush()  # Flush to get the new_section.id
-
-        if section_type == ResumeItemType.skill:
-            new_item = ResumeItem()
-            new_item.user_id = user.id
-            new_item.section_id = new_section.id
-            new_item.title = "Skill Category"
-            new_item.organization = ""
-            new_item.start_date = datetime.now()
-            new_item.end_date = None
-            new_item.location = ""
-            new_item.description = "Resume-building, problem-solving, etc"
-        elif section_type == ResumeItemType.project:
-            new_item = ResumeItem()
-            new_item.user_id = user.id
-            new_item.section_id = new_section.id
-            new_item.title = "Project Name"
-            new_item.organization = ""
-            new_item.start_date = datetime.now()
-            new_item.end_date = None
-            new_item.location = ""
-            new_item.description = "Project description"
-        elif section_type == ResumeItemType.experience:
-            new_item = ResumeItem()
-            new_item.user_id = user.id
-            new_item.section_id = new_section.id
-            new_item.title = "Job Title"
-            new_item.organization = "Company Name"
-            new_item.start_date = datetime.now()
-            new_item.end_date = None
-            new_item.location = ""
-            new_item.description = "Job description"
-        elif section_type == ResumeItemType.education:
-            new_item = ResumeItem()
-            new_item.user_id = user.id
-            new_item.section_id = new_section.id
-            new_item.title = "Degree"
-            new_item.organization = "University Name"
-            new_item.start_date = datetime.now()
-            new_item.end_date = None
-            new_item.location = ""
-            new_item.description = "Degree description"
-        else:
-            raise ValueError(f"Invalid section type: {section_type}")
 
-        db_session.add(new_item)
+def clone_resume(resume_id: int, user: User, db_session) -> int | None:
+    """
+    Copies a resume with its sections and items using INSERT ... SELECT, so the
+    rows are copied by the database whatever the size of the resume.
+    Returns the id of the copy, or None if the resume was not found.
+    """
+    source_name = db_session.scalar(
+        select(Resume.resume_name).where(
+            Resume.id == resume_id, Resume.user_id == user.id
+        )
+    )
+    if source_name is None:
+        return None
 
-    return new_resume
+    new_name = _next_resume_name(user, db_session, f"{source_name} (Copy)")
+    new_resume_id = db_session.scalar(
+        insert(Resume)
+        .from_select(
+            ["user_id", "resume_name", "template_id"],
+            select(Resume.user_id, literal(new_name), Resume.template_id).where(
+                Resume.id == resume_id
+            ),
+        )
+        .returning(Resume.id)
+    )
 
+    # The id of the section each copy was made from is kept in its display_order
+    # until its items are copied, then the display order is copied over
+    db_session.execute(
+        insert(ResumeSection).from_select(
+            ["user_id", "resume_id", "name", "section_type", "display_order"],
+            select(
+                ResumeSection.user_id,
+                literal(new_resume_id),
+                ResumeSection.name,
+                ResumeSection.section_type,
+                ResumeSection.id,
+            ).where(ResumeSection.resume_id == resume_id),
+        )
+    )
 
-def get_full_resume(resume_id: int, user: User, db_session) -> Resume | None:
+    new_section = aliased(ResumeSection)
+    item_columns = [
+        "user_id",
+        "title",
+        "organization",
+        "start_date",
+        "end_date",
+        "location",
+        "description",
+        "display_order",
+    ]
+    db_session.execute(
+        insert(ResumeItem).from_select(
+            [*item_columns, "section_id"],
+            select(
+                *(getattr(ResumeItem, column) for column in item_columns),
+                new_section.id,
+            ).join(
+                new_section,
+                and_(
+                    new_section.resume_id == new_resume_id,
+                    new_section.display_order == ResumeItem.section_id,
+                ),
+            ),
+        )
+    )
+
+    source_section = aliased(ResumeSection)
+    db_session.execute(
+        update(ResumeSection)
+        .where(ResumeSection.resume_id == new_resume_id)
+        .values(
+            display_order=select(source_section.display_order)
+            .where(source_section.id == ResumeSection.display_order)
+            .scalar_subquery()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return new_resume_id
+
+
+def get_full_resume(
+    resume_id: int, user: User, db_session, refresh=False
+) -> Resume | None:
     """
     Fetches a single resume with all its sections and items eagerly loaded.
     Ensures the resume belongs to the specified user by checking the relationship.
+    With refresh=True, objects already in the session are reloaded as well.
     """
     stmt = (
         select(Resume)
         .where(Resume.id == resume_id, Resume.user == user)
         .options(selectinload(Resume.sections).selectinload(ResumeSection.items))
     )
+    if refresh:
+        stmt = stmt.execution_options(populate_existing=True)
     return db_session.execute(stmt).scalar_one_or_none()
+
+
+def resume_etag(resume_id: int, version: int) -> str:
+    """
+    Entity tag of a version of a resume, used for conditional requests.
+    """
+    return f"{resume_id}-{version}"
+
+
+def get_resume_version(resume_id: int, user: User, db_session) -> int | None:
+    """
+    Fetches only the version of a resume belonging to the given user,
+    without loading its sections and items.
+    """
+    stmt = select(Resume.version).where(
+        Resume.id == resume_id, Resume.user_id == user.id
+    )
+    return db_session.execute(stmt).scalar_one_or_none()
+
+
+def bump_resume_version(
+    resume_id: int,
+    db_session,
+    expected_version: int | None = None,
+    to_version: int | None = None,
+) -> bool:
+    """
+    Increments the version of a resume after a change to it or anything nested in it,
+    or sets it to to_version if given.
+    If expected_version is given, the bump only happens if the resume is still at
+    that version, which guards against lost updates. Returns whether it was bumped.
+    """
+    stmt = (
+        update(Resume)
+        .where(Resume.id == resume_id)
+        .values(version=to_version or Resume.version + 1)
+    )
+    if expected_version is not None:
+        stmt = stmt.where(Resume.version == expected_version)
+    return db_session.execute(stmt).rowcount == 1
+
+
+def list_resumes(
+    user: User, db_session, after: int | None = None, limit: int = 100, full=False
+) -> tuple[list[dict], int | None, bool]:
+    """
+    Lists a page of the user's resumes ordered by id, starting after the given
+    cursor. By default only a summary of each resume is fetched in a single
+    column-projected query; with full=True their stored snapshots are read instead,
+    and the ones missing are built (the caller commits them).
+    Returns the serialized resumes, the cursor of the next page, if any, and
+    whether snapshots were built.
+    """
+    if full:
+        stmt = select(Resume.id, Resume.snapshot)
+    else:
+        stmt = select(
+            Resume.id,
+            Resume.resume_name,
+            Resume.template_id,
+            Resume.created_at,
+            Resume.updated_at,
+            Resume.version,
+        )
+    stmt = stmt.where(Resume.user_id == user.id).order_by(Resume.id).limit(limit + 1)
+    if after is not None:
+        stmt = stmt.where(Resume.id > after)
+
+    rows = db_session.execute(stmt).all()
+    built = False
+    if full:
+        missing = [r.id for r in rows[:limit] if r.snapshot is None]
+        snapshots = refresh_resume_snapshots(missing, user, db_session)
+        built = bool(snapshots)
+        resumes = [json.loads(r.snapshot or snapshots[r.id]) for r in rows[:limit]]
+    else:
+        resumes = [
+            {
+                "id": r.id,
+                "resume_name": r.resume_name or "Untitled Resume",
+                "template_id": r.template_id,
+                "created_at": r.created_at.isoformat() if r.created_at else None,
+                "updated_at": r.updated_at.isoformat() if r.updated_at else None,
+                "version": r.version,
+            }
+            for r in rows[:limit]
+        ]
+
+    next_cursor = resumes[-1]["id"] if len(rows) > limit else None
+    return resumes, next_cursor, built
+
+
+def refresh_resume_snapshot(
+    resume_id: int, user: User, db_session
+) -> tuple[int, str] | None:
+    """
+    Serializes a resume and stores the snapshot alongside it, in the same
+    transaction as the write that changed it. Returns the version and snapshot.
+    """
+    db_session.flush()
+    resume = get_full_resume(resume_id, user, db_session, refresh=True)
+    if not resume:
+        return None
+
+    snapshot = json.dumps(resume.json(), separators=(",", ":"))
+    _store_snapshots({resume_id: snapshot}, db_session)
+    return resume.version, snapshot
+
+
+def refresh_resume_snapshots(
+    resume_ids: list[int], user: User, db_session
+) -> dict[int, str]:
+    """
+    Builds and stores the snapshots of several resumes at once, loading them with
+    their sections and items in a single eager-loaded query.
+    Returns the snapshots by resume id.
+    """
+    if not resume_ids:
+        return {}
+
+    stmt = (
+        select(Resume)
+        .where(Resume.id.in_(resume_ids), Resume.user_id == user.id)
+        .options(selectinload(Resume.sections).selectinload(ResumeSection.items))
+        .execution_options(populate_existing=True)
+    )
+    snapshots = {
+        resume.id: json.dumps(resume.json(), separators=(",", ":"))
+        for resume in db_session.execute(stmt).scalars()
+    }
+    _store_snapshots(snapshots, db_session)
+    return snapshots
+
+
+def _store_snapshots(snapshots: dict[int, str], db_session):
+    if not snapshots:
+        return
+    # Storing a snapshot isn't a change of the resume, so keep updated_at as is
+    # rather than letting its onupdate fire
+    table = Resume.__table__
+    db_session.execute(
+        update(table)
+        .where(table.c.id == bindparam("resume_id"))
+        .values(snapshot=bindparam("snapshot"), updated_at=table.c.updated_at),
+        [
+            {"resume_id": resume_id, "snapshot": snapshot}
+            for resume_id, snapshot in snapshots.items()
+        ],
+    )
+
+
+def mark_resume_changed(
+    resume_id: int,
+    user: User,
+    db_session,
+    expected_version: int | None = None,
+    to_version: int | None = None,
+) -> tuple[int, str] | None:
+    """
+    Bumps the version of a changed resume (see bump_resume_version) and refreshes
+    its snapshot. Returns the new version and snapshot, or None if the resume is
+    no longer at expected_version.
+    """
+    if not bump_resume_version(resume_id, db_session, expected_version, to_version):
+        return None
+    return refresh_resume_snapshot(resume_id, user, db_session)
+
+
+def get_resume_document(
+    resume_id: int, user: User, db_session
+) -> tuple[int, str, bool] | None:
+    """
+    Fetches the version and serialized snapshot of a resume in a single row
+    read, without building any ORM objects. Resumes without a snapshot yet
+    get one built, which the caller commits when told so by the returned flag.
+    Returns the version, the snapshot and whether it was built.
+    """
+    stmt = select(Resume.version, Resume.snapshot).where(
+        Resume.id == resume_id, Resume.user_id == user.id
+    )
+    row = db_session.execute(stmt).one_or_none()
+    if row is None:
+        return None
+
+    if row.snapshot is None:
+        # Stored with a Core UPDATE, which doesn't mark the session as dirty
+        built = refresh_resume_snapshot(resume_id, user, db_session)
+        return (*built, True) if built else None
+    return row.version, row.snapshot, False
+
+
+# Fields that PATCH /resume/<id> may replace, per target
+PATCHABLE_RESUME_FIELDS = {"resume_name", "template_id"}
+PATCHABLE_USER_FIELDS = {"name", "phone", "email", "linkedin", "github", "website"}
+# User fields that can't be cleared (NOT NULL)
+REQUIRED_USER_FIELDS = {"name", "email"}
+PATCHABLE_SECTION_FIELDS = {"name"}
+PATCHABLE_ITEM_FIELDS = {
+    "title",
+    "organization",
+    "start_date",
+    "end_date",
+    "location",
+    "description",
+}
+
+
+def _parse_patch_path(path) -> list[str]:
+    if not isinstance(path, str) or not path.startswith("/"):
+        raise ValueError(f"Invalid patch path: {path}")
+    return path[1:].split("/")
+
+
+def _parse_patch_id(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid id in patch path: {value}")
+
+
+def _parse_text_value(field: str, value, nullable: bool = False) -> str | None:
+    if value is None:
+        if nullable:
+            return None
+        raise ValueError(f"Missing value for {field}")
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid value for {field}, expected a string")
+    return value
+
+
+def _parse_item_field(field: str, value):
+    if field in ("start_date", "end_date"):
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"Invalid {field} format: {value}")
+        parsed = parse_iso_date_string(value)
+        if field == "start_date" and not parsed:
+            raise ValueError(f"Invalid start_date format: {value}")
+        return parsed
+    return _parse_text_value(field, value)
+
+
+def _parse_resume_field(field: str, value, db_session):
+    if field == "template_id":
+        # bool is an int too
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"Invalid template_id: {value}")
+        if db_session.get(Template, value) is None:
+            raise ValueError(f"Template not found: {value}")
+        return value
+    return _parse_text_value(field, value)
+
+
+def _parse_user_field(field: str, value, user: User, db_session):
+    value = _parse_text_value(field, value, nullable=field not in REQUIRED_USER_FIELDS)
+    if field == "email" and value != user.email:
+        taken = db_session.scalar(
+            select(User.id).where(User.email == value, User.id != user.id)
+        )
+        if taken:
+            raise ValueError("Email is already used by another account.")
+    return value
+
+
+def apply_resume_patch(
+    resume_id: int, user: User, operations: list, db_session
+) -> list[int]:
+    """
+    Applies JSON Patch (RFC 6902) style operations to a resume, writing only the
+    rows they touch. Sections and items are addressed by id rather than by
+    array index, so operations stay valid while other rows are reordered:
+
+        {"op": "replace", "path": "/resume_name", "value": ...}
+        {"op": "replace", "path": "/sections/<id>/name", "value": ...}
+        {"op": "replace", "path": "/sections/<id>/items/<id>/<field>", "value": ...}
+        {"op": "add", "path": "/sections/<id>/items/-", "value": {item}}
+        {"op": "remove", "path": "/sections/<id>/items/<id>"}
+
+    Returns the ids of the added items, in the order of their operations.
+    Raises ValueError for invalid operations or paths to rows not in the resume.
+    The caller bumps the version of the resume (see mark_resume_changed).
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("Patch must be a non-empty list of operations.")
+
+    resume_values, user_values = {}, {}
+    section_values: dict[int, dict] = {}
+    item_values: dict[tuple[int, int], dict] = {}
+    item_adds: list[tuple[int, dict]] = []
+    item_removes: set[tuple[int, int]] = set()
+
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise ValueError("Each patch operation must be an object.")
+        op = operation.get("op")
+        path = _parse_patch_path(operation.get("path"))
+        value = operation.get("value")
+
+        match op, path:
+            case "replace", [field] if field in PATCHABLE_RESUME_FIELDS:
+                resume_values[field] = _parse_resume_field(field, value, db_session)
+            case "replace", [field] if field in PATCHABLE_USER_FIELDS:
+                user_values[field] = _parse_user_field(field, value, user, db_session)
+            case "replace", ["sections", section_id, field] if (
+                field in PATCHABLE_SECTION_FIELDS
+            ):
+                if not value or not isinstance(value, str):
+                    raise ValueError("Missing name for section.")
+                section_values.setdefault(_parse_patch_id(section_id), {})[field] = (
+                    value
+                )
+            case "replace", ["sections", section_id, "items", item_id, field] if (
+                field in PATCHABLE_ITEM_FIELDS
+            ):
+                key = (_parse_patch_id(section_id), _parse_patch_id(item_id))
+                item_values.setdefault(key, {})[field] = _parse_item_field(field, value)
+            case "add", ["sections", section_id, "items", "-"]:
+                parsed_data = _parse_item_data(
+                    value if isinstance(value, dict) else {}, user.id
+                )
+                if not parsed_data:
+                    raise ValueError("Invalid item in add operation.")
+                item_adds.append((_parse_patch_id(section_id), parsed_data))
+            case "remove", ["sections", section_id, "items", item_id]:
+                item_removes.add(
+                    (_parse_patch_id(section_id), _parse_patch_id(item_id))
+                )
+            case _:
+                raise ValueError(
+                    f"Unsupported patch operation: {op} {operation.get('path')}"
+                )
+
+    # Make sure every addressed section and item belongs to this resume
+    section_ids = {
+        *section_values,
+        *(s for s, _ in item_values),
+        *(s for s, _ in item_adds),
+        *(s for s, _ in item_removes),
+    }
+    item_keys = {*item_values, *item_removes}
+    if section_ids:
+        found = set(
+            db_session.scalars(
+                select(ResumeSection.id).where(
+                    ResumeSection.resume_id == resume_id,
+                    ResumeSection.user_id == user.id,
+                    ResumeSection.id.in_(section_ids),
+                )
+            )
+        )
+        if found != section_ids:
+            raise ValueError(
+                f"Resume sections not found: {sorted(section_ids - found)}"
+            )
+    if item_keys:
+        found = set(
+            db_session.execute(
+                select(ResumeItem.section_id, ResumeItem.id).where(
+                    ResumeItem.user_id == user.id,
+                    ResumeItem.id.in_({i for _, i in item_keys}),
+                )
+            ).tuples()
+        )
+        if not item_keys <= found:
+            raise ValueError(
+                f"Resume items not found: {sorted(i for _, i in item_keys - found)}"
+            )
+    if item_removes & item_values.keys():
+        raise ValueError("Cannot replace fields of a removed item.")
+
+    if resume_values:
+        db_session.execute(
+            update(Resume).where(Resume.id == resume_id).values(**resume_values)
+        )
+    if user_values:
+        for field, value in user_values.items():
+            setattr(user, field, value)
+        if db_session.is_modified(user):
+            _mark_other_resumes_changed(user.id, resume_id, db_session)
+    if section_values:
+        db_session.execute(
+            update(ResumeSection),
+            [{"id": id, **values} for id, values in section_values.items()],
+        )
+    if item_values:
+        db_session.execute(
+            update(ResumeItem),
+            [{"id": id, **values} for (_, id), values in item_values.items()],
+        )
+
+    added_ids = []
+    for section_id, parsed_data in item_adds:
+        # Appended after the last item of the section
+        next_order = (
+            select(func.coalesce(func.max(ResumeItem.display_order) + 1, 0))
+            .where(ResumeItem.section_id == section_id)
+            .scalar_subquery()
+        )
+        added_ids.append(
+            db_session.scalar(
+                insert(ResumeItem)
+                .values(
+                    user_id=user.id,
+                    section_id=section_id,
+                    display_order=next_order,
+                    **parsed_data,
+                )
+                .returning(ResumeItem.id)
+            )
+        )
+
+    if item_removes:
+        db_session.execute(
+            delete(ResumeItem)
+            .where(ResumeItem.id.in_({i for _, i in item_removes}))
+            .execution_options(synchronize_session=False)
+        )
+        emptied = db_session.scalars(
+            select(ResumeSection.name).where(
+                ResumeSection.id.in_({s for s, _ in item_removes}),
+                ~ResumeSection.items.any(),
+            )
+        ).all()
+        if emptied:
+            raise ValueError(
+                f"Section '{emptied[0]}' cannot be empty. Please add at least one item."
+            )
+
+    return added_ids
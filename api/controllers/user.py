@@ -0,0 +1,56 @@
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from cache import get_cached_value, get_generation, invalidate_cache, set_cached_value
+from models.user import User
+
+# Users are loaded on every authenticated request, their columns are cached for
+# this long (seconds) on top of being invalidated whenever they change. Keys carry
+# the user's cache generation, bumped once a change is committed, so a row read
+# before the change and cached after it is never read again.
+USER_CACHE_TIMEOUT = 300
+
+USER_CACHE_KEY = "user"
+
+
+def load_cached_user(user_id, db_session) -> User | None:
+    """
+    Loads a user for the login manager, from the cache when possible. Cached
+    users are attached to the session as if they had been queried.
+    """
+    # The generation is read before the row, so that a row read before a change
+    # is only ever cached under the generation from before it
+    key = f"{USER_CACHE_KEY}:{user_id}:g{get_generation(int(user_id))}"
+    columns = get_cached_value(key)
+    if columns is None:
+        user = db_session.execute(select(User).filter_by(id=user_id)).scalar()
+        if user:
+            set_cached_value(
+                key,
+                {c.key: getattr(user, c.key) for c in User.__table__.columns},
+                timeout=USER_CACHE_TIMEOUT,
+            )
+        return user
+
+    user = User(**columns)
+    make_transient_to_detached(user)
+    db_session.add(user)
+    return user
+
+
+@event.listens_for(User, "after_update")
+def _track_changed_user(mapper, connection, target: User):
+    object_session(target).info.setdefault("changed_user_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session):
+    # Invalidated once committed, rows read until then are cached under the old
+    # generation
+    for user_id in session.info.pop("changed_user_ids", ()):
+        invalidate_cache(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session: Session):
+    session.info.pop("changed_user_ids", None)
@@ -1,8 +1,74 @@
+import os
+import sqlite3
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 
 db = SQLAlchemy()
 
+# Connection pool of each API process (Postgres)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE") or 5)
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW") or 10)
+# Connections are replaced after this many seconds, before the server or a
+# proxy in between drops them
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE") or 1800)
+# Queries running longer than this (milliseconds) are cancelled by Postgres
+DB_STATEMENT_TIMEOUT = int(os.environ.get("DB_STATEMENT_TIMEOUT") or 15000)
+# Time (milliseconds) a SQLite write waits for the others to finish before
+# failing with "database is locked". Writes queue up behind every thread of
+# every process, so this is as long as Postgres lets a statement run.
+SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT") or 15000)
+
+
+def engine_options(database_uri: str) -> dict:
+    """
+    Engine options for the database in use, set as SQLALCHEMY_ENGINE_OPTIONS.
+    """
+    if database_uri.startswith("sqlite"):
+        # SQLite connections are configured when opened, see _configure_sqlite
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+        "connect_args": {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"},
+    }
+
+
+@event.listens_for(Engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    # Readers don't block the writer in WAL mode, and concurrent writers wait
+    # for each other instead of failing right away
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.close()
+
+
+def create_schema(database_uri: str):
+    """
+    Creates the tables that don't exist yet without an app, so that gunicorn can
+    do it once before forking its workers (see gunicorn.conf.py).
+    """
+    # Imported for their tables to be registered on the metadata
+    import models.rating, models.resume, models.template, models.user  # noqa: F401
+
+    engine = create_engine(database_uri, **engine_options(database_uri))
+    try:
+        db.metadata.create_all(engine)
+    finally:
+        engine.dispose()
+
 
 def init_db(app):
+    # Already created by the gunicorn master, workers creating it at once would
+    # fail on the tables the others just created
+    if os.environ.get("DB_SCHEMA_CREATED"):
+        return
     with app.app_context():
         db.create_all()
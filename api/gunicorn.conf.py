@@ -0,0 +1,49 @@
+import os
+import secrets
+
+# Gunicorn settings of the API, picked up by `gunicorn -c gunicorn.conf.py`.
+# See https://docs.gunicorn.org/en/stable/settings.html
+
+bind = "0.0.0.0:8080"
+
+# Processes share caches, locks, pending autosaves and rating job statuses only
+# through Redis (see cache.py). Without it each process would have its own, so
+# a single process serves every request.
+if os.environ.get("WEB_CONCURRENCY"):
+    workers = int(os.environ["WEB_CONCURRENCY"])
+elif os.environ.get("REDIS_URL"):
+    workers = os.cpu_count() or 1
+else:
+    workers = 1
+
+# Requests mostly wait on the database, Redis, texify or Google, so each process
+# serves several at once from a thread pool. Compile status streams hold a thread
+# for as long as they are open.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS") or 8)
+
+# Idle keep-alive connections (e.g. from the load balancer) are closed after this long
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+
+# Login sessions are signed with SECRET_KEY. When it isn't set, the app makes up
+# one per process, so one is made up here instead for every process to share.
+os.environ.setdefault("SECRET_KEY", secrets.token_hex(24))
+
+# Each process imports the app itself, so its database pool, Redis connections
+# and background threads are never shared with (or lost by) a fork
+preload_app = False
+
+
+def on_starting(server):
+    # The schema is created once, before workers start, instead of by each of
+    # them. An in-memory database is per process so it is still left to each.
+    database_uri = os.environ.get("DATABASE_URL") or "sqlite:///:memory:"
+    if ":memory:" in database_uri:
+        return
+
+    from db import create_schema
+
+    create_schema(database_uri)
+    os.environ["DB_SCHEMA_CREATED"] = "1"
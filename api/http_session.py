@@ -0,0 +1,27 @@
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Default (connect, read) timeouts in seconds of outgoing requests
+HTTP_TIMEOUT = (3.05, 10)
+# Keep-alive connections kept per host
+HTTP_POOL_SIZE = 32
+
+
+def make_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """
+    Session reusing keep-alive connections across requests and threads.
+    """
+    session = requests.Session()
+    # Shared by concurrent requests of different users, so cookies set by a
+    # response must never be sent along with another user's request
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared by every request of the process
+http = make_session()
@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import override
+
+from sqlalchemy import DateTime, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from models import Base
+
+from db import db
+
+
+# AI rating of a resume's content, shared by every resume with the same content
+class ResumeRating(db.Model, Base):
+    __tablename__ = "resume_ratings"
+
+    # sha256 of the normalized resume content, prompt and model (see rating_key)
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    rating: Mapped[float] = mapped_column(nullable=False)
+    reasoning: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+    @override
+    def json(self):
+        return {"rating": self.rating, "reasoning": self.reasoning}
@@ -3,7 +3,7 @@ from datetime import datetime
 
 from typing import List, override
 
-from sqlalchemy import DateTime, ForeignKey, func
+from sqlalchemy import DateTime, ForeignKey, Index, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from models import Base
@@ -16,6 +16,8 @@ from db import db
 
 class Resume(db.Model, Base):
     __tablename__ = "resumes"
+    # Resumes are listed per user in id order (see list_resumes)
+    __table_args__ = (Index("ix_resumes_user_id_id", "user_id", "id"),)
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey(User.id, ondelete="CASCADE"))
@@ -27,6 +29,10 @@ class Resume(db.Model, Base):
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+    # Bumped on every change to the resume, its sections or its items
+    version: Mapped[int] = mapped_column(default=1, server_default="1")
+    # Serialized json() of the resume, refreshed in the same transaction as every write
+    snapshot: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
 
     sections: Mapped[List["ResumeSection"]] = relationship(
         back_populates="resume",
@@ -44,6 +50,7 @@ class Resume(db.Model, Base):
             "template_id": self.template_id,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "version": self.version,
             "name": self.user.name,
             "resume_name": self.resume_name or "Untitled Resume",
             "phone": self.user.phone,
@@ -72,6 +79,11 @@ SECTION_TYPE_TO_DISPLAY_NAME_MAPPING = {
 
 class ResumeSection(db.Model, Base):
     __tablename__ = "resume_sections"
+    __table_args__ = (
+        Index(
+            "ix_resume_sections_resume_id_display_order", "resume_id", "display_order"
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey(User.id, ondelete="CASCADE"))
@@ -102,6 +114,11 @@ class ResumeSection(db.Model, Base):
 
 class ResumeItem(db.Model, Base):
     __tablename__ = "resume_items"
+    __table_args__ = (
+        Index(
+            "ix_resume_items_section_id_display_order", "section_id", "display_order"
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey(User.id, ondelete="CASCADE"))
@@ -0,0 +1,205 @@
+"""
+Regression tests for the indexes of the resume access paths: the queries
+behind them must be answered from an index, never by scanning a whole table.
+
+Runs against SQLite (EXPLAIN QUERY PLAN), and against Postgres (EXPLAIN) too
+when TEST_POSTGRES_URL points at a database the tests may create tables in.
+"""
+
+import os
+import re
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask
+from sqlalchemy import event, insert, select
+
+from db import db
+from controllers.resume import get_full_resume, list_resumes
+from models.rating import ResumeRating  # noqa: F401
+from models.resume import Resume, ResumeItem, ResumeItemType, ResumeSection
+from models.template import Template
+from models.user import User
+
+RESUME_TABLES = ("resumes", "resume_sections", "resume_items")
+
+DATABASE_URLS = ["sqlite://"]
+if os.environ.get("TEST_POSTGRES_URL"):
+    DATABASE_URLS.append(os.environ["TEST_POSTGRES_URL"])
+
+
+@pytest.fixture(scope="module", params=DATABASE_URLS)
+def app(request):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = request.param
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        _seed()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _seed(users=3, resumes_per_user=5):
+    db.session.add(Template(id=1, name="Default", uri=""))
+    now = datetime.now(timezone.utc)
+    for u in range(users):
+        user = User(
+            google_id=f"g{u}", name=f"User {u}", email=f"{u}@x", profile_picture=""
+        )
+        db.session.add(user)
+        db.session.flush()
+        for r in range(resumes_per_user):
+            resume_id = db.session.scalar(
+                insert(Resume)
+                .values(user_id=user.id, resume_name=f"Resume {r}", template_id=1)
+                .returning(Resume.id)
+            )
+            for order, section_type in enumerate(ResumeItemType):
+                section_id = db.session.scalar(
+                    insert(ResumeSection)
+                    .values(
+                        user_id=user.id,
+                        resume_id=resume_id,
+                        name=section_type.value,
+                        section_type=section_type,
+                        display_order=order,
+                    )
+                    .returning(ResumeSection.id)
+                )
+                db.session.execute(
+                    insert(ResumeItem),
+                    [
+                        {
+                            "user_id": user.id,
+                            "section_id": section_id,
+                            "title": f"Item {i}",
+                            "organization": "",
+                            "start_date": now,
+                            "location": "",
+                            "description": "",
+                            "display_order": i,
+                        }
+                        for i in range(3)
+                    ],
+                )
+    db.session.commit()
+
+
+def _captured_selects(fn):
+    """
+    Runs fn and returns the SELECT statements it executed on the resume tables,
+    with their parameters.
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and any(
+            table in statement for table in RESUME_TABLES
+        ):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        db.session.expire_all()
+        fn()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    assert statements, "No query on the resume tables was executed"
+    return statements
+
+
+def _plan(statement: str, parameters) -> str:
+    with db.engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return "\n".join(row[-1] for row in rows)
+        # Tiny test tables are cheaper to scan, make the planner pick any usable index
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return "\n".join(row[0] for row in rows)
+
+
+def _full_scans(plan: str) -> list[str]:
+    tables = "|".join(RESUME_TABLES)
+    patterns = (
+        rf"^SCAN ({tables})$",  # SQLite, without USING INDEX
+        rf"Seq Scan on ({tables})\b",  # Postgres
+    )
+    return [
+        line.strip()
+        for line in plan.splitlines()
+        if any(re.search(p, line.strip()) for p in patterns)
+    ]
+
+
+def _assert_indexed(fn, *indexes: str):
+    plans = [_plan(*s) for s in _captured_selects(fn)]
+    for plan in plans:
+        assert not _full_scans(plan), f"Full table scan in plan:\n{plan}"
+    joined = "\n".join(plans)
+    for index in indexes:
+        assert index in joined, f"{index} is not used by any of:\n{joined}"
+
+
+@pytest.fixture
+def user(app):
+    return db.session.scalar(select(User).filter_by(google_id="g1"))
+
+
+def test_get_full_resume_uses_indexes(user):
+    resume_id = db.session.scalar(
+        select(Resume.id).where(Resume.user_id == user.id).limit(1)
+    )
+    _assert_indexed(
+        lambda: get_full_resume(resume_id, user, db.session),
+        "ix_resume_sections_resume_id_display_order",
+        "ix_resume_items_section_id_display_order",
+    )
+
+
+@pytest.mark.parametrize("full", [False, True])
+def test_list_resumes_uses_index(user, full):
+    _assert_indexed(
+        lambda: list_resumes(user, db.session, limit=2, full=full),
+        "ix_resumes_user_id_id",
+    )
+
+
+def test_list_resumes_next_page_uses_index(user):
+    first = db.session.scalar(
+        select(Resume.id).where(Resume.user_id == user.id).order_by(Resume.id)
+    )
+    _assert_indexed(
+        lambda: list_resumes(user, db.session, after=first, limit=2),
+        "ix_resumes_user_id_id",
+    )
+
+
+def test_section_lookup_uses_index(user):
+    resume_id = db.session.scalar(
+        select(Resume.id).where(Resume.user_id == user.id).limit(1)
+    )
+    _assert_indexed(
+        lambda: db.session.scalars(
+            select(ResumeSection)
+            .where(ResumeSection.resume_id == resume_id)
+            .order_by(ResumeSection.display_order)
+        ).all(),
+        "ix_resume_sections_resume_id_display_order",
+    )
+
+
+def test_item_lookup_uses_index(user):
+    section_id = db.session.scalar(
+        select(ResumeSection.id).where(ResumeSection.user_id == user.id).limit(1)
+    )
+    _assert_indexed(
+        lambda: db.session.scalars(
+            select(ResumeItem)
+            .where(ResumeItem.section_id == section_id)
+            .order_by(ResumeItem.display_order)
+        ).all(),
+        "ix_resume_items_section_id_display_order",
+    )
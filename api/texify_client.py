@@ -0,0 +1,226 @@
+import hashlib
+import os
+import time
+
+import redis
+from celery import Celery
+from flask import current_app
+
+from http_session import http, HTTP_TIMEOUT
+
+TEXIFY_URL = os.environ.get("TEXIFY_URL") or "http://texify:8080"
+# Broker and result backend shared with texify's workers. When set, compiles are
+# enqueued and looked up directly instead of going through texify's HTTP API.
+TEXIFY_BROKER_URL = os.environ.get("TEXIFY_BROKER_URL")
+TEXIFY_RESULT_BACKEND = os.environ.get("TEXIFY_RESULT_BACKEND")
+
+# Consumed by every texify compile worker (see texify/routing.py)
+COMPILE_QUEUE = "compile"
+COMPILE_TASK = "tasks.compile_latex_to_pdf"
+
+# Compiles enqueued here are routed like texify routes its own, to the shard
+# whose workers likely have the template warm. These must be set the same as
+# texify's (see texify/routing.py).
+COMPILE_SHARDS = int(os.environ.get("COMPILE_SHARDS") or 1)
+COMPILE_SPILL_THRESHOLD = int(os.environ.get("COMPILE_SPILL_THRESHOLD") or 8)
+COMPILE_AFFINITY_BY_USER = os.environ.get("COMPILE_AFFINITY_BY_USER") == "1"
+
+# Status streams end after this long (seconds), clients reconnect if still pending
+STATUS_STREAM_TIMEOUT = 120
+# Interval (seconds) at which an idle status stream yields, to keep it alive
+STATUS_STREAM_KEEPALIVE = 15
+# Delay (seconds) between status checks when there is no result backend to watch
+STATUS_POLL_INTERVAL = 2
+
+# Producer only, the tasks themselves are defined and run by texify
+celery_app = (
+    Celery("texify", broker=TEXIFY_BROKER_URL, backend=TEXIFY_RESULT_BACKEND)
+    if TEXIFY_BROKER_URL
+    else None
+)
+
+
+# Broker connection used to read the backlog of the shard queues
+broker_redis = (
+    redis.Redis.from_url(TEXIFY_BROKER_URL)
+    if TEXIFY_BROKER_URL and TEXIFY_BROKER_URL.startswith("redis")
+    else None
+)
+
+
+# Same rendezvous hashing as texify's rank_shards, so both pick the same shard
+def rank_shards(key: str) -> list[int]:
+    def score(shard: int) -> int:
+        return int(hashlib.md5(f"{key}:{shard}".encode("utf-8")).hexdigest(), 16)
+
+    return sorted(range(COMPILE_SHARDS), key=score, reverse=True)
+
+
+def affinity_key(resume_json: dict) -> str:
+    key = str(resume_json.get("template_id"))
+    if COMPILE_AFFINITY_BY_USER:
+        key += f":{resume_json.get('user_id')}"
+    return key
+
+
+def compile_queue(resume_json: dict) -> str:
+    """
+    Queue of the shard preferred for a resume, or of the next one if it is
+    overloaded, or the shared queue once every shard is (see texify's
+    route_compile_task).
+    """
+    if broker_redis is None:
+        return COMPILE_QUEUE
+    ranked = rank_shards(affinity_key(resume_json))
+
+    pipe = broker_redis.pipeline()
+    for shard in ranked:
+        pipe.llen(f"{COMPILE_QUEUE}.{shard}")
+    backlogs = pipe.execute()
+
+    for shard, backlog in zip(ranked, backlogs):
+        if backlog < COMPILE_SPILL_THRESHOLD:
+            return f"{COMPILE_QUEUE}.{shard}"
+    return COMPILE_QUEUE
+
+
+def format_status(state: str, result) -> dict:
+    # Same as texify's status format. Celery returns PENDING for unknown tasks too.
+    if state == "PENDING":
+        return {"status": "pending"}
+    elif state == "FAILURE":
+        return {"status": "failure", "error": str(result)}
+    elif state == "SUCCESS":
+        return {"status": "done", "url": result}
+    else:
+        return {"status": state}
+
+
+def submit_compile(resume_json: dict) -> str:
+    """
+    Starts compiling a resume and returns the id of the compile task.
+    """
+    # TODO: for future support of custom templates, non-empty so not falsey
+    template = " "
+    if celery_app:
+        try:
+            task = celery_app.send_task(
+                COMPILE_TASK,
+                args=[template, resume_json],
+                queue=compile_queue(resume_json),
+                retry=False,
+            )
+            return task.id
+        except Exception as e:
+            current_app.logger.warning(f"Could not enqueue compile, using HTTP: {e}")
+
+    r = http.post(
+        TEXIFY_URL + "/compile",
+        json={"template": template, "data": resume_json},
+        timeout=HTTP_TIMEOUT,
+    )
+    r.raise_for_status()
+    return r.json()["task_id"]
+
+
+def get_status(task_id: str) -> dict:
+    if celery_app and TEXIFY_RESULT_BACKEND:
+        try:
+            task = celery_app.AsyncResult(task_id)
+            return format_status(task.state, task.result)
+        except Exception as e:
+            current_app.logger.warning(
+                f"Could not read compile status, using HTTP: {e}"
+            )
+
+    r = http.get(TEXIFY_URL + "/status/" + task_id, timeout=HTTP_TIMEOUT)
+    r.raise_for_status()
+    return r.json()
+
+
+def get_statuses(task_ids: list[str]) -> dict[str, dict]:
+    """
+    Looks up the status of many compile tasks at once.
+    """
+    if celery_app and TEXIFY_RESULT_BACKEND:
+        try:
+            backend = celery_app.backend
+            values = backend.mget([backend.get_key_for_task(t) for t in task_ids])
+            statuses = {}
+            for task_id, value in zip(task_ids, values):
+                if value is None:
+                    statuses[task_id] = format_status("PENDING", None)
+                    continue
+                meta = backend.decode_result(value)
+                statuses[task_id] = format_status(meta["status"], meta["result"])
+            return statuses
+        except Exception as e:
+            current_app.logger.warning(
+                f"Could not read compile statuses, using HTTP: {e}"
+            )
+
+    r = http.post(
+        TEXIFY_URL + "/status/batch", json={"task_ids": task_ids}, timeout=HTTP_TIMEOUT
+    )
+    r.raise_for_status()
+    return r.json()["statuses"]
+
+
+def _is_finished(status: dict) -> bool:
+    return status.get("status") in ("done", "failure")
+
+
+def watch_status(task_id: str, timeout: float = STATUS_STREAM_TIMEOUT):
+    """
+    Yields the status of a compile task, then again whenever it changes, until it
+    is done or failed or the timeout passes. Yields None every
+    STATUS_STREAM_KEEPALIVE seconds in which nothing changed.
+    """
+    deadline = time.monotonic() + timeout
+    pubsub = None
+    if celery_app and TEXIFY_RESULT_BACKEND:
+        try:
+            # The result backend publishes every state it stores on the task's key.
+            # Subscribed before the current status is read so no change is missed.
+            backend = celery_app.backend
+            pubsub = backend.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(backend.get_key_for_task(task_id))
+        except Exception as e:
+            current_app.logger.warning(
+                f"Could not watch compile status, polling instead: {e}"
+            )
+            if pubsub:
+                pubsub.close()
+            pubsub = None
+
+    try:
+        status = get_status(task_id)
+        yield status
+        last_sent = time.monotonic()
+        while not _is_finished(status):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if pubsub:
+                message = pubsub.get_message(
+                    timeout=min(remaining, STATUS_STREAM_KEEPALIVE)
+                )
+                if message:
+                    meta = backend.decode_result(message["data"])
+                    new_status = format_status(meta["status"], meta["result"])
+                else:
+                    new_status = status
+            else:
+                time.sleep(min(remaining, STATUS_POLL_INTERVAL))
+                new_status = get_status(task_id)
+
+            if new_status != status:
+                status = new_status
+                yield status
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= STATUS_STREAM_KEEPALIVE:
+                yield None
+                last_sent = time.monotonic()
+    finally:
+        if pubsub:
+            pubsub.close()
@@ -1,10 +1,22 @@
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from flask import Blueprint, jsonify, current_app
 from flask_login import login_required, current_user
 from models.user import User  # Assuming this exists
-from controllers.resume import get_full_resume  # Assuming this exists
+from controllers.resume import get_resume_document
+from controllers.rating import get_rating, rating_content, rating_key, save_rating
 from db import db  # Assuming this exists
+from cache import (
+    acquire_slot,
+    add_cached_value,
+    delete_cached_value,
+    get_cached_value,
+    release_slot,
+    set_cached_value,
+)
 
 import google.generativeai as genai
 from google.generativeai.types import GenerationConfig
@@ -28,86 +40,223 @@ Focus on providing actionable feedback that the user can implement to improve th
 Do not directly reference the JSON structure or fields. Just respond by referring to the natural language text.
 """
 
+# The model rating resumes. Ratings are cached per model (and prompt), so
+# changing either of them rates every resume anew.
+GEMINI_MODEL = "gemini-1.5-flash-latest"
+
+RATING_PROMPT = "Please analyze and rate the following resume:\n\n{resume}"
+
 # Define the structured response format we expect from the model.
-GENERATION_CONFIG = GenerationConfig(
-    response_mime_type="application/json",
-    response_schema={
-        "type": "object",
-        "properties": {
-            "rating": {
-                "type": "number",
-                "description": "A rating of the resume on a scale from 1 to 10.",
-            },
-            "reasoning": {
-                "type": "string",
-                "description": "A concise, constructive reasoning for the rating, written from the perspective of Pro from Prolio.",
-            },
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rating": {
+            "type": "number",
+            "description": "A rating of the resume on a scale from 1 to 10.",
+        },
+        "reasoning": {
+            "type": "string",
+            "description": "A concise, constructive reasoning for the rating, written from the perspective of Pro from Prolio.",
         },
-        "required": ["rating", "reasoning"],
     },
+    "required": ["rating", "reasoning"],
+}
+GENERATION_CONFIG = GenerationConfig(
+    response_mime_type="application/json", response_schema=RESPONSE_SCHEMA
 )
 
 
+# One model client shared by every rating, instead of one per request.
+gemini_model = genai.GenerativeModel(
+    model_name=GEMINI_MODEL,
+    system_instruction=SYSTEM_PROMPT,
+    generation_config=GENERATION_CONFIG,
+)
+
+
+# --- Background Rating Jobs ---
+
+# Ratings run in the background so they don't hold a request worker while the
+# model answers. At most this many call the model at once, counted across every
+# API process and instance (through Redis, see acquire_slot) to protect the quota.
+AI_RATING_CONCURRENCY = int(os.environ.get("AI_RATING_CONCURRENCY") or 4)
+# Ratings running or waiting across every API process and instance, more are
+# turned away until some finish.
+AI_RATING_QUEUE_LIMIT = int(os.environ.get("AI_RATING_QUEUE_LIMIT") or 32)
+# Lifetime (seconds) of a job's status. A job that isn't done by then (e.g. its
+# process went away) can be submitted again.
+RATING_JOB_TIMEOUT = 300
+# Suggested delay (seconds) before retrying a rating that was turned away
+RATING_RETRY_AFTER = 5
+# Delay (seconds) between attempts of a job to get a slot to call the model
+RATING_SLOT_POLL_INTERVAL = 0.1
+
+# Names of the slots of ratings running or waiting, and of model calls
+RATING_QUEUE_SLOTS = "ai_rating_queue"
+RATING_CALL_SLOTS = "ai_rating_calls"
+
+# Status of the pending or failed rating of some content, by content hash. Jobs
+# are identified by the hash of what they rate, so identical requests share a job.
+RATING_JOB_KEY = "rating_job"
+
+# A process never runs more model calls than are allowed across all of them
+rating_executor = ThreadPoolExecutor(
+    max_workers=AI_RATING_CONCURRENCY, thread_name_prefix="ai-rating"
+)
+
+
+def _generate_rating(content: dict) -> dict:
+    """
+    Asks the model to rate the given resume content. Raises ValueError if the
+    model refused to.
+    """
+    prompt = RATING_PROMPT.format(resume=json.dumps(content))
+    response = gemini_model.generate_content(prompt)
+
+    # UPDATE: Modern best practice is to check the prompt_feedback for safety blocks
+    # instead of relying solely on a broad StopCandidateException.
+    if response.prompt_feedback.block_reason:
+        current_app.logger.error(
+            f"Error: Model response was blocked. Reason: {response.prompt_feedback.block_reason.name}"
+        )
+        raise ValueError(
+            "The resume could not be processed due to a content policy violation."
+        )
+
+    # The response.text should be a valid JSON string due to the generation_config.
+    return json.loads(response.text)
+
+
+def _rate_in_turn(content: dict) -> dict:
+    """
+    Rates the given resume content once one of the model call slots shared by
+    every API process is free. Raises TimeoutError if none frees up in time.
+    """
+    deadline = time.monotonic() + RATING_JOB_TIMEOUT
+    while not (
+        token := acquire_slot(
+            RATING_CALL_SLOTS, AI_RATING_CONCURRENCY, RATING_JOB_TIMEOUT
+        )
+    ):
+        if time.monotonic() > deadline:
+            raise TimeoutError("Timed out waiting to call the model")
+        time.sleep(RATING_SLOT_POLL_INTERVAL)
+    try:
+        return _generate_rating(content)
+    finally:
+        release_slot(RATING_CALL_SLOTS, token)
+
+
+def _run_rating(app, content_hash: str, content: dict, queue_token: str):
+    key = f"{RATING_JOB_KEY}:{content_hash}"
+    try:
+        with app.app_context():
+            try:
+                save_rating(content_hash, _rate_in_turn(content), db.session)
+                # The stored rating is the job's result from now on
+                delete_cached_value(key)
+            except ValueError as e:
+                set_cached_value(
+                    key,
+                    {"status": "failure", "error": str(e)},
+                    timeout=RATING_JOB_TIMEOUT,
+                )
+            except Exception as e:
+                current_app.logger.error(f"An unexpected error occurred: {e}")
+                set_cached_value(
+                    key,
+                    {
+                        "status": "failure",
+                        "error": "An internal error occurred while rating the resume.",
+                    },
+                    timeout=RATING_JOB_TIMEOUT,
+                )
+    finally:
+        release_slot(RATING_QUEUE_SLOTS, queue_token)
+
+
+def _submit_rating(content_hash: str, content: dict) -> dict | None:
+    """
+    Starts rating some content in the background unless it is already being
+    rated. Returns the job's status, or None if too many ratings are in progress.
+    """
+    key = f"{RATING_JOB_KEY}:{content_hash}"
+    pending = {"status": "pending"}
+    if not add_cached_value(key, pending, timeout=RATING_JOB_TIMEOUT):
+        status = get_cached_value(key)
+        if status and status["status"] == "pending":
+            return status
+        # Failed ratings are tried again
+        set_cached_value(key, pending, timeout=RATING_JOB_TIMEOUT)
+
+    queue_token = acquire_slot(
+        RATING_QUEUE_SLOTS, AI_RATING_QUEUE_LIMIT, RATING_JOB_TIMEOUT
+    )
+    if not queue_token:
+        delete_cached_value(key)
+        return None
+    rating_executor.submit(
+        _run_rating,
+        current_app._get_current_object(),
+        content_hash,
+        content,
+        queue_token,
+    )
+    return pending
+
+
 # --- Flask Blueprint ---
 
 ai_views = Blueprint("ai_views", __name__, url_prefix="/ai")
 
 
-@ai_views.get("/rate/<int:resume_id>")
+@ai_views.post("/rate/<int:resume_id>")
 @login_required
 def rate_resume(resume_id: int):
     """
-    Asynchronously rates a resume using the Gemini 1.5 Flash API with JSON mode.
+    Starts rating a resume using the Gemini 1.5 Flash API with JSON mode, in the
+    background. Returns the job to poll, or the rating itself if the resume's
+    content was rated before.
     """
     try:
         # Ensure the logged-in user context is valid.
         assert isinstance(current_user, User)
 
-        # Get the resume data.
-        resume_data = get_full_resume(resume_id, current_user, db.session)
+        # Get the resume data, pre-serialized in a single row read.
+        document = get_resume_document(resume_id, current_user, db.session)
 
         # If resume is not found, return 404.
-        if not resume_data:
+        if not document:
             return jsonify({"error": "Resume not found or access denied."}), 404
+        _, snapshot, built = document
+        if built:
+            # Store the snapshot built for a resume that did not have one yet
+            db.session.commit()
 
-        # Convert the resume object to a JSON string for the prompt.
+        # Only what the resume reads like is rated, ids and timestamps are not.
         try:
-            resume_json_string = resume_data.json()
-        except TypeError:
-            # This catches cases where the resume_data is not JSON serializable.
+            content = rating_content(json.loads(snapshot))
+        except (TypeError, ValueError):
             return jsonify(
                 {"error": "Internal server error: Could not process resume data."}
             ), 500
 
-        # Call the Gemini API asynchronously.
-        prompt = (
-            f"Please analyze and rate the following resume:\n\n{resume_json_string}"
-        )
-
-        # Initialize the Gemini model.
-        gemini_model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash-latest",
-            system_instruction=SYSTEM_PROMPT,
-            generation_config=GENERATION_CONFIG,
+        # Unchanged resumes get the rating they already got.
+        content_hash = rating_key(
+            content, GEMINI_MODEL, SYSTEM_PROMPT, RATING_PROMPT, RESPONSE_SCHEMA
         )
+        cached = get_rating(content_hash, db.session)
+        if cached:
+            return jsonify({"job_id": content_hash, "status": "done", **cached}), 200
 
-        response = gemini_model.generate_content(prompt)
-
-        # UPDATE: Modern best practice is to check the prompt_feedback for safety blocks
-        # instead of relying solely on a broad StopCandidateException.
-        if response.prompt_feedback.block_reason:
-            current_app.logger.error(
-                f"Error: Model response was blocked. Reason: {response.prompt_feedback.block_reason.name}"
+        status = _submit_rating(content_hash, content)
+        if status is None:
+            return (
+                jsonify({"error": "Too many ratings in progress, try again shortly."}),
+                503,
+                {"Retry-After": str(RATING_RETRY_AFTER)},
             )
-            return jsonify(
-                {
-                    "error": "The resume could not be processed due to a content policy violation."
-                }
-            ), 400
-
-        # The response.text should be a valid JSON string due to the generation_config.
-        result = json.loads(response.text)
-        return jsonify(result), 200
+        return jsonify({"job_id": content_hash, **status}), 202
 
     except Exception as e:
         current_app.logger.error(f"An unexpected error occurred: {e}")
@@ -115,3 +264,19 @@ def rate_resume(resume_id: int):
         return jsonify(
             {"error": "An internal error occurred while rating the resume."}
         ), 500
+
+
+@ai_views.get("/rate/jobs/<job_id>")
+@login_required
+def rating_status(job_id: str):
+    """
+    Status of a rating job, with the rating once it is done.
+    """
+    status = get_cached_value(f"{RATING_JOB_KEY}:{job_id}")
+    if status:
+        return jsonify(status), 200
+
+    rating = get_rating(job_id, db.session)
+    if rating:
+        return jsonify({"status": "done", **rating}), 200
+    return jsonify({"error": "Rating job not found."}), 404
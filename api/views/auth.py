@@ -3,6 +3,7 @@ from flask_login import login_user, login_required, logout_user
 
 import os
 import json
+import time
 import base64
 from urllib.parse import urlparse
 
@@ -12,8 +13,7 @@ from models.user import User
 from db import db
 
 from cache import invalidate_cache
-
-import requests
+from http_session import http, HTTP_TIMEOUT
 
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", None)
 GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET", None)
@@ -22,13 +22,28 @@ GOOGLE_DISCOVERY_URL = (
     or "https://accounts.google.com/.well-known/openid-configuration"
 )
 
-client = WebApplicationClient(GOOGLE_CLIENT_ID)
+# Time (seconds) the discovery document is reused before being fetched again
+GOOGLE_DISCOVERY_TTL = 3600
 
 auth_view = Blueprint("auth_view", __name__, url_prefix="/auth")
 
+# Discovery document and the time it expires at. Replaced as a whole, so threads
+# refreshing it at once at worst fetch it twice.
+_google_provider_cfg = None
+
 
 def get_google_provider_cfg():
-    return requests.get(GOOGLE_DISCOVERY_URL).json()
+    global _google_provider_cfg
+    if _google_provider_cfg is None or _google_provider_cfg[0] < time.monotonic():
+        r = http.get(GOOGLE_DISCOVERY_URL, timeout=HTTP_TIMEOUT)
+        r.raise_for_status()
+        _google_provider_cfg = (time.monotonic() + GOOGLE_DISCOVERY_TTL, r.json())
+    return _google_provider_cfg[1]
+
+
+# The client keeps the tokens it parses, so each login gets its own
+def make_oauth_client() -> WebApplicationClient:
+    return WebApplicationClient(GOOGLE_CLIENT_ID)
 
 
 # Google's OAuth2 protocol only supports passing a state parameter on
@@ -84,7 +99,7 @@ def login():
     if not os.environ.get("GOOGLE_DISCOVERY_URL"):
         base_url = base_url.replace("http://", "https://")
         base_url = base_url.replace("api-dot-prolio-resume", "prolio-resume")
-    request_uri = client.prepare_request_uri(
+    request_uri = make_oauth_client().prepare_request_uri(
         authorization_endpoint,
         redirect_uri=base_url + "/callback",
         scope=["openid", "email", "profile"],
@@ -117,6 +132,7 @@ def callback():
         REDIRECT_URL = REDIRECT_URL.replace("http://", "https://")
 
     # Prepare and send a request to get tokens! Yay tokens!
+    client = make_oauth_client()
     token_url, headers, body = client.prepare_token_request(
         token_endpoint,
         authorization_response=AUTHORIZATION_URL,
@@ -124,11 +140,12 @@ def callback():
         code=code,
     )
 
-    token_response = requests.post(
+    token_response = http.post(
         token_url,
         headers=headers,
         data=body,
         auth=(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET),
+        timeout=HTTP_TIMEOUT,
     )
 
     # Parse the tokens!
@@ -139,7 +156,7 @@ def callback():
     # Get user information
     userinfo_endpoint = google_provider_cfg["userinfo_endpoint"]
     uri, headers, body = client.add_token(userinfo_endpoint)
-    userinfo_response = requests.get(uri, headers=headers, data=body)
+    userinfo_response = http.get(uri, headers=headers, data=body, timeout=HTTP_TIMEOUT)
     res = userinfo_response.json()
     current_app.logger.debug(res)
 
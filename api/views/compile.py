@@ -1,19 +1,70 @@
-import os
+import json
+import time
+import hashlib
+import tempfile
+import zipfile
 
-from flask import Blueprint
+from flask import Blueprint, Response, request, current_app, stream_with_context
 
 from flask_login import login_required, current_user
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from werkzeug.utils import secure_filename
 from db import db
 
+from cache import get_cached_value, set_cached_value
 from controllers.resume import get_full_resume
 # from controllers.template import get_template
 
 from models.user import User
+from models.resume import Resume, ResumeSection
+from http_session import http
+from texify_client import submit_compile, get_status, get_statuses, watch_status
 import requests
 
 compile_views = Blueprint("compile_views", __name__, url_prefix="/compile")
 
-TEXIFY_URL = os.environ.get("TEXIFY_URL") or "http://texify:8080"
+# Maximum time (seconds) an export waits for all of its compiles to finish
+EXPORT_TIMEOUT = 120
+# Delay (seconds) between status checks of pending export compiles
+EXPORT_POLL_INTERVAL = 1
+# Compiled PDF URLs are reused for slightly less than their signed URL lifetime
+COMPILED_PDF_TIMEOUT = 3000
+# Largest PDF (bytes) an export downloads. PDFs are downloaded in full before
+# being added, in memory up to EXPORT_PDF_SPOOL_SIZE and to a temporary file beyond
+EXPORT_MAX_PDF_SIZE = 20 * 1024 * 1024
+EXPORT_PDF_SPOOL_SIZE = 1024 * 1024
+# Maximum number of task ids accepted by a single batch status lookup
+MAX_BATCH_STATUS = 500
+
+
+def _compiled_pdf_key(resume_json: dict) -> str:
+    digest = hashlib.sha256(
+        json.dumps(resume_json, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return f"compiled_pdf:{digest}"
+
+
+class _ZipStream:
+    """
+    Write-only file object for zipfile that buffers output until drained,
+    so the archive can be streamed without being held in memory.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
 
 
 @compile_views.post("/<int:resume_id>")
@@ -30,20 +81,152 @@ def compile_resume(resume_id: int):
     # if not template:
     #     return {"error": "Template not found"}, 404
 
-    r = requests.post(
-        TEXIFY_URL + "/compile",
-        json={
-            "template": " ",  # TODO: for future support of custom templates, non-empty so not falsey
-            "data": result.json(),
-        },
-    )
-
-    return r.json()
+    return {"task_id": submit_compile(result.json())}
 
 
 @compile_views.get("/status/<job_id>")
 @login_required
 def check_status(job_id: str):
-    r = requests.get(TEXIFY_URL + "/status/" + job_id)
+    return get_status(job_id)
+
+
+@compile_views.get("/status/<job_id>/stream")
+@login_required
+def stream_status(job_id: str):
+    """
+    Streams the status of a compile task as Server-Sent Events, one event per
+    change, until it is done or failed. Clients reconnect if the stream ends
+    while the task is still pending.
+    """
+    # The stream doesn't need the database, don't hold a connection while it lasts
+    db.session.close()
+
+    def generate():
+        for status in watch_status(job_id):
+            if status is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {json.dumps(status)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@compile_views.post("/status/batch")
+@login_required
+def check_status_batch():
+    data = request.get_json(silent=True) or {}
+    task_ids = data.get("task_ids")
+    if not isinstance(task_ids, list) or not all(
+        isinstance(t, str) and t for t in task_ids
+    ):
+        return {"error": "task_ids must be a list of task ids."}, 400
+    if len(task_ids) > MAX_BATCH_STATUS:
+        return {"error": f"At most {MAX_BATCH_STATUS} task ids are allowed."}, 400
+
+    return {"statuses": get_statuses(list(dict.fromkeys(task_ids)))}
+
+
+@compile_views.get("/export")
+@login_required
+def export_resumes():
+    """
+    Compiles (or reuses recently compiled PDFs of) every resume belonging to
+    the current user and streams them back as a zip archive as each one finishes.
+    """
+    stmt = (
+        select(Resume)
+        .where(Resume.user_id == current_user.id)
+        .options(selectinload(Resume.sections).selectinload(ResumeSection.items))
+    )
+    resumes = db.session.execute(stmt).scalars().all()
+    if not resumes:
+        return {"error": "No resumes found"}, 404
+
+    ready = []  # (filename, url) of PDFs that can be downloaded right away
+    pending = {}  # task_id -> (filename, cache key)
+    used_names = set()
+    for resume in resumes:
+        resume_json = resume.json()
+
+        filename = secure_filename(resume.resume_name or "") or "resume"
+        if filename in used_names:
+            filename = f"{filename}_{resume.id}"
+        used_names.add(filename)
+        filename += ".pdf"
+
+        key = _compiled_pdf_key(resume_json)
+        url = get_cached_value(key)
+        if url:
+            ready.append((filename, url))
+        else:
+            pending[submit_compile(resume_json)] = (filename, key)
 
-    return r.json()
+    # The stream doesn't need the database, don't hold a connection while it lasts
+    db.session.close()
+
+    def generate():
+        stream = _ZipStream()
+        errors = []
+        # Entries of a non-seekable stream carry their sizes in data descriptors,
+        # which streaming unzippers only read back for deflated entries
+        with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as archive:
+
+            def add_pdf(filename: str, url: str) -> bool:
+                # Only complete downloads are added, a download failing midway
+                # must not leave a truncated PDF in the archive
+                with tempfile.SpooledTemporaryFile(EXPORT_PDF_SPOOL_SIZE) as pdf:
+                    try:
+                        with http.get(url, stream=True, timeout=30) as r:
+                            r.raise_for_status()
+                            for chunk in r.iter_content(chunk_size=64 * 1024):
+                                pdf.write(chunk)
+                                if pdf.tell() > EXPORT_MAX_PDF_SIZE:
+                                    errors.append(f"{filename}: PDF too large")
+                                    return False
+                    except requests.RequestException as e:
+                        current_app.logger.error(f"Could not download {filename}: {e}")
+                        errors.append(f"{filename}: download failed")
+                        return False
+
+                    pdf.seek(0)
+                    with archive.open(filename, "w") as entry:
+                        while chunk := pdf.read(64 * 1024):
+                            entry.write(chunk)
+                            yield stream.drain()
+                return True
+
+            for filename, url in ready:
+                yield from add_pdf(filename, url)
+
+            deadline = time.monotonic() + EXPORT_TIMEOUT
+            while pending and time.monotonic() < deadline:
+                statuses = get_statuses(list(pending))
+                for task_id, status in statuses.items():
+                    if status.get("status") == "done":
+                        filename, key = pending.pop(task_id)
+                        if (yield from add_pdf(filename, status["url"])):
+                            set_cached_value(
+                                key, status["url"], timeout=COMPILED_PDF_TIMEOUT
+                            )
+                    elif status.get("status") == "failure":
+                        filename, _ = pending.pop(task_id)
+                        errors.append(f"{filename}: compilation failed")
+                if pending:
+                    time.sleep(EXPORT_POLL_INTERVAL)
+
+            for filename, _ in pending.values():
+                errors.append(f"{filename}: compilation timed out")
+            if errors:
+                archive.writestr("errors.txt", "\n".join(errors) + "\n")
+
+        yield stream.drain()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/zip",
+        headers={"Content-Disposition": "attachment; filename=resumes.zip"},
+    )
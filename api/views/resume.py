@@ -1,4 +1,6 @@
-from flask import Blueprint, request, jsonify
+import hashlib
+
+from flask import Blueprint, request, jsonify, make_response
 from sqlalchemy import select, and_
 
 from models.user import User
@@ -9,12 +11,41 @@ from flask_login import login_required, current_user
 
 from db import db
 
-from cache import cache_response
-
-from controllers.resume import process_resume_update, get_full_resume, create_new_resume
+from cache import cache_response, invalidates_cache
+from controllers.autosave import (
+    wants_coalescing,
+    get_effective_version,
+    buffer_resume_update,
+)
+
+from controllers.resume import (
+    process_resume_update,
+    get_full_resume,
+    create_new_resume,
+    resume_etag,
+    get_resume_version,
+    list_resumes,
+    refresh_resume_snapshot,
+    mark_resume_changed,
+    get_resume_document,
+    apply_resume_patch,
+    clone_resume,
+)
 
 resume_views = Blueprint("resume_views", __name__, url_prefix="/resume")
 
+# Maximum number of resumes returned per page by /resume/all
+RESUME_PAGE_SIZE = 100
+
+
+def _snapshot_response(resume_id: int, version: int, snapshot: str, status=200):
+    # Serve the pre-serialized resume as is, without encoding it again
+    response = make_response(snapshot, status)
+    response.mimetype = "application/json"
+    response.set_etag(resume_etag(resume_id, version))
+    return response
+
+
 # ==================== Resume Routes ====================
 
 
@@ -23,14 +54,31 @@ resume_views = Blueprint("resume_views", __name__, url_prefix="/resume")
 @cache_response
 def get_all_resumes():
     """
-    Return all resumes belonging to a user.
+    Return a page of the resumes belonging to a user. Only a summary of each
+    resume is returned unless the full documents are requested with ?full=1.
+    Pages are requested with ?after=<next_cursor>&limit=<n>.
     """
-    stmt = select(Resume).where(Resume.user_id == current_user.id)
-    result = db.session.execute(stmt)
-    result = result.scalars().all()
-    result = [r.json() for r in result]
+    after = request.args.get("after", type=int)
+    limit = request.args.get("limit", default=RESUME_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, RESUME_PAGE_SIZE))
+    full = request.args.get("full") in ("1", "true")
+
+    resumes, next_cursor, built = list_resumes(
+        current_user, db.session, after, limit, full
+    )
+    if built:
+        # Store the snapshots built for resumes that did not have one yet
+        db.session.commit()
 
-    return jsonify({"resumes": result})
+    response = jsonify({"resumes": resumes, "next_cursor": next_cursor})
+    response.set_etag(
+        hashlib.sha1(
+            ",".join(resume_etag(r["id"], r["version"]) for r in resumes).encode(
+                "utf-8"
+            )
+        ).hexdigest()
+    )
+    return response
 
 
 @resume_views.get("/<int:id>")
@@ -41,38 +89,85 @@ def get_resume(id: int):
     with a given resume id, using the controller to fetch it.
     """
     assert isinstance(current_user, User)
-    resume = get_full_resume(id, current_user, db.session)
-    if resume:
-        return resume.json()
-    return jsonify({"error": "Resume not found"}), 404
+
+    # A single row read of the pre-serialized resume, no ORM objects are built
+    document = get_resume_document(id, current_user, db.session)
+    if document is None:
+        return jsonify({"error": "Resume not found"}), 404
+    version, snapshot, built = document
+    if built:
+        # Store the snapshot built for a resume that did not have one yet
+        db.session.commit()
+
+    etag = resume_etag(id, version)
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+    return _snapshot_response(id, version, snapshot)
 
 
 @resume_views.post("/create")
 @login_required
+@invalidates_cache
 def create_resume():
     """
     Creates a new resume with default values for the current user using a controller.
     """
     try:
         assert isinstance(current_user, User)
-        new_resume = create_new_resume(current_user, db.session)
+        resume_id = create_new_resume(current_user, db.session)
+        version, snapshot = refresh_resume_snapshot(resume_id, current_user, db.session)
         db.session.commit()
         # The frontend expects the full resume object directly
-        return jsonify(new_resume.json()), 201
+        return _snapshot_response(resume_id, version, snapshot, 201)
     except Exception as e:
         db.session.rollback()
         print(f"Error during resume creation: {e}")
         return jsonify({"error": f"An unexpected error occurred. {e}"}), 500
 
 
+@resume_views.post("/<int:id>/clone")
+@login_required
+@invalidates_cache
+def clone_resume_route(id: int):
+    """
+    Copies a resume of the current user with all of its sections and items.
+    """
+    try:
+        assert isinstance(current_user, User)
+        resume_id = clone_resume(id, current_user, db.session)
+        if resume_id is None:
+            return jsonify({"error": "Resume not found or access denied"}), 404
+        version, snapshot = refresh_resume_snapshot(resume_id, current_user, db.session)
+        db.session.commit()
+        return _snapshot_response(resume_id, version, snapshot, 201)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error during resume clone: {e}")
+        return jsonify({"error": f"An unexpected error occurred. {e}"}), 500
+
+
 @resume_views.put("/update/<int:id>")
 @login_required
+@invalidates_cache
 def update_resume(id: int):
     data = request.get_json()
     if not data or type(data) is not dict:
         return jsonify({"error": "Missing required data"}), 400
 
     assert isinstance(current_user, User)
+
+    if wants_coalescing():
+        return _buffer_update(id, data)
+
+    # Reject lost updates before loading the whole resume
+    version = get_resume_version(id, current_user, db.session)
+    if version is None:
+        return jsonify({"error": "Resume not found or access denied"}), 404
+    if request.if_match and not request.if_match.contains(resume_etag(id, version)):
+        return jsonify({"error": "Resume was modified by another request"}), 412
+
     resume_to_update = get_full_resume(id, current_user, db.session)
 
     if not resume_to_update:
@@ -80,14 +175,15 @@ def update_resume(id: int):
 
     try:
         process_resume_update(resume_to_update, data, db.session)
+        expected_version = version if request.if_match else None
+        # The snapshot has the latest state with new IDs, no re-fetch needed
+        document = mark_resume_changed(id, current_user, db.session, expected_version)
+        if not document:
+            db.session.rollback()
+            return jsonify({"error": "Resume was modified by another request"}), 412
         db.session.commit()
-        # Re-fetch the entire resume to get the latest state with new IDs
-        assert isinstance(current_user, User)
-        updated_resume = get_full_resume(id, current_user, db.session)
-        if not updated_resume:
-            return jsonify({"error": "Could not retrieve updated resume."}), 404
         # The frontend expects the resume object directly
-        return jsonify(updated_resume.json())
+        return _snapshot_response(id, *document)
     except ValueError as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 400
@@ -99,8 +195,71 @@ def update_resume(id: int):
         ), 500
 
 
+def _buffer_update(id: int, data: dict):
+    # Acknowledge the update with the version it will be written as, it is written
+    # together with the following ones (see controllers/autosave.py)
+    version = get_effective_version(id, current_user, db.session)
+    if version is None:
+        return jsonify({"error": "Resume not found or access denied"}), 404
+    if request.if_match and not request.if_match.contains(resume_etag(id, version)):
+        return jsonify({"error": "Resume was modified by another request"}), 412
+
+    expected_version = version if request.if_match else None
+    try:
+        new_version = buffer_resume_update(
+            id, current_user, data, db.session, expected_version
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if new_version is None:
+        return jsonify({"error": "Resume was modified by another request"}), 412
+
+    response = jsonify({"id": id, "version": new_version})
+    response.set_etag(resume_etag(id, new_version))
+    return response, 202
+
+
+@resume_views.patch("/<int:id>")
+@login_required
+@invalidates_cache
+def patch_resume(id: int):
+    """
+    Applies a list of patch operations (see apply_resume_patch) to a resume,
+    writing only the rows they touch. The known version must be sent with
+    If-Match, and only the new version and the ids of added items are returned.
+    """
+    operations = request.get_json(silent=True)
+
+    assert isinstance(current_user, User)
+
+    version = get_resume_version(id, current_user, db.session)
+    if version is None:
+        return jsonify({"error": "Resume not found or access denied"}), 404
+    if not request.if_match:
+        return jsonify({"error": "If-Match with the resume version is required"}), 428
+    if not request.if_match.contains(resume_etag(id, version)):
+        return jsonify({"error": "Resume was modified by another request"}), 412
+
+    try:
+        added_ids = apply_resume_patch(id, current_user, operations, db.session)
+        document = mark_resume_changed(id, current_user, db.session, version)
+        if not document:
+            db.session.rollback()
+            return jsonify({"error": "Resume was modified by another request"}), 412
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+
+    new_version, _ = document
+    response = jsonify({"id": id, "version": new_version, "added_ids": added_ids})
+    response.set_etag(resume_etag(id, new_version))
+    return response
+
+
 @resume_views.delete("/delete/<int:id>")
 @login_required
+@invalidates_cache
 def delete_resume(id: int):
     stmt = select(Resume).where(
         and_(Resume.user_id == current_user.id, Resume.id == id)
@@ -146,6 +305,7 @@ def get_resume_section(resume_id: int, id: int):
 
 @resume_views.post("/section/create/<int:resume_id>")
 @login_required
+@invalidates_cache
 def create_resume_section(resume_id: int):
     """
     Create a resume section.
@@ -171,8 +331,9 @@ def create_resume_section(resume_id: int):
     if "display_order" in data:
         new_section.display_order = data["display_order"]
 
-    new_section.save_to_db()
-    db.session.flush()
+    db.session.add(new_section)
+    mark_resume_changed(resume.id, current_user, db.session)
+    db.session.commit()
 
     return jsonify(
         {
@@ -184,6 +345,7 @@ def create_resume_section(resume_id: int):
 
 @resume_views.put("/section/update/<int:resume_id>/<int:id>")
 @login_required
+@invalidates_cache
 def update_resume_section(resume_id: int, id: int):
     """
     Update metadata information about a resume section.
@@ -219,7 +381,8 @@ def update_resume_section(resume_id: int, id: int):
     if "display_order" in data:
         section_to_update.display_order = data["display_order"]
 
-    section_to_update.save_to_db()
+    mark_resume_changed(resume.id, current_user, db.session)
+    db.session.commit()
     return jsonify(
         {"message": "Updated resume section", "section": section_to_update.json()}
     )
@@ -227,6 +390,7 @@ def update_resume_section(resume_id: int, id: int):
 
 @resume_views.delete("/section/delete/<int:resume_id>/<int:id>")
 @login_required
+@invalidates_cache
 def delete_resume_section(resume_id: int, id: int):
     """
     Delete a resume section.
@@ -250,7 +414,9 @@ def delete_resume_section(resume_id: int, id: int):
     if not section_to_delete:
         return {"error": "Resume section not found"}, 404
 
-    section_to_delete.delete_from_db()
+    db.session.delete(section_to_delete)
+    mark_resume_changed(resume.id, current_user, db.session)
+    db.session.commit()
     return jsonify({"message": "Deleted resume section"})
 
 
@@ -274,6 +440,7 @@ def get_resume_item(id: int):
 
 @resume_views.post("/item/create")
 @login_required
+@invalidates_cache
 def create_resume_item():
     """
     Create a resume item.
@@ -312,6 +479,7 @@ def create_resume_item():
 
 @resume_views.put("/item/update/<int:id>")
 @login_required
+@invalidates_cache
 def update_resume_item(id: int):
     """
     Update a resume item.
@@ -340,6 +508,8 @@ def update_resume_item(id: int):
     if "description" in data:
         item.description = data["description"]
 
+    if item.section:
+        mark_resume_changed(item.section.resume_id, current_user, db.session)
     item.save_to_db()
     return jsonify(
         {"message": f"Updated resume item (id = {item.id})", "item": item.json()}
@@ -348,6 +518,7 @@ def update_resume_item(id: int):
 
 @resume_views.delete("/item/delete/<int:id>")
 @login_required
+@invalidates_cache
 def delete_resume_item(id: int):
     """
     Delete a resume item.
@@ -359,6 +530,10 @@ def delete_resume_item(id: int):
     if not item:
         return {"error": "Resume item not found."}, 404
 
-    item.delete_from_db()
+    resume_id = item.section.resume_id if item.section else None
+    db.session.delete(item)
+    if resume_id:
+        mark_resume_changed(resume_id, current_user, db.session)
+    db.session.commit()
 
     return jsonify({"message": "Resume item deleted"})
@@ -1,8 +1,24 @@
 from flask import Flask, request
 from tasks import compile_latex_to_pdf
+from routing import get_cache_stats
 
 app = Flask(__name__)
 
+# Maximum number of task ids accepted by a single batch status lookup
+MAX_BATCH_STATUS = 500
+
+
+def format_status(state: str, result: any) -> dict:
+    # Note that celery returns PENDING even if the task_id is not known
+    if state == "PENDING":
+        return {"status": "pending"}
+    elif state == "FAILURE":
+        return {"status": "failure", "error": str(result)}
+    elif state == "SUCCESS":
+        return {"status": "done", "url": result}
+    else:
+        return {"status": state}
+
 
 @app.get("/ping")
 def ping():
@@ -21,15 +37,47 @@ def compile():
 @app.get("/status/<task_id>")
 def status(task_id: str):
     task = compile_latex_to_pdf.AsyncResult(task_id)
-    # Note that celery returns PENDING even if the task_id is not known
-    if task.state == "PENDING":
-        return {"status": "pending"}
-    elif task.state == "FAILURE":
-        return {"status": "failure", "error": str(task.result)}
-    elif task.state == "SUCCESS":
-        return {"status": "done", "url": task.result}
-    else:
-        return {"status": task.state}
+    return format_status(task.state, task.result)
+
+
+@app.post("/status/batch")
+def status_batch():
+    """
+    Looks up the status of many tasks with a single read from the result backend.
+    """
+    data = request.get_json(silent=True) or {}
+    task_ids = data.get("task_ids")
+    if not isinstance(task_ids, list) or not all(
+        isinstance(t, str) and t for t in task_ids
+    ):
+        return {"error": "task_ids must be a list of task ids."}, 400
+    if len(task_ids) > MAX_BATCH_STATUS:
+        return {"error": f"At most {MAX_BATCH_STATUS} task ids are allowed."}, 400
+
+    task_ids = list(dict.fromkeys(task_ids))
+    if not task_ids:
+        return {"statuses": {}}
+
+    backend = compile_latex_to_pdf.backend
+    values = backend.mget([backend.get_key_for_task(t) for t in task_ids])
+
+    statuses = {}
+    for task_id, value in zip(task_ids, values):
+        if value is None:
+            statuses[task_id] = format_status("PENDING", None)
+            continue
+        meta = backend.decode_result(value)
+        statuses[task_id] = format_status(meta["status"], meta["result"])
+
+    return {"statuses": statuses}
+
+
+@app.get("/stats/cache")
+def cache_stats():
+    """
+    Template cache hit rates per compile worker.
+    """
+    return {"workers": get_cache_stats()}
 
 
 if __name__ == "__main__":
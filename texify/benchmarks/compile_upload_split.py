@@ -0,0 +1,174 @@
+"""
+Compile/upload split benchmark: a burst of compiles is run through the real
+Celery tasks and workers with pdflatex and the GCS upload stubbed by sleeps,
+and the throughput at saturation is reported for compile workers that also
+upload (as before the split) and for a separate, thread pooled upload worker.
+
+    python benchmarks/compile_upload_split.py
+    python benchmarks/compile_upload_split.py --jobs 400 --compile-concurrency 8
+
+Needs the Redis used as broker and result backend, at REDIS_IP (default
+localhost) on port 6379. Its queues are purged before each run.
+"""
+
+import argparse
+import os
+import signal
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+TEXIFY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run from texify/ or anywhere else, texify's modules are imported from texify/
+sys.path.insert(0, TEXIFY_DIR)
+os.environ.setdefault("REDIS_IP", "localhost")
+
+import tasks  # noqa: E402
+from manager import celery_app, redis_client  # noqa: E402
+from routing import SHARED_COMPILE_QUEUE, shard_queue  # noqa: E402
+
+# Seconds each stubbed upload takes, read by the workers this script starts
+UPLOAD_TIME = float(os.environ.get("BENCHMARK_UPLOAD_TIME") or 0)
+
+QUEUES = [shard_queue(0), SHARED_COMPILE_QUEUE, "upload"]
+
+FAKE_PDFLATEX = """#!/bin/sh
+sleep {compile_time}
+printf '%%PDF-1.4\\n%%%%EOF\\n' > document.pdf
+"""
+
+RESUME = {
+    "name": "Ada Lovelace",
+    "email": "ada@example.com",
+    "phone": "555-0100",
+    "github": "ada",
+    "linkedin": "ada",
+    "template_id": 1,
+    "sections": [
+        {
+            "section_type": "Experience",
+            "items": [
+                {
+                    "title": "Analyst",
+                    "organization": "Analytical Engine",
+                    "location": "London",
+                    "start_date": "1842-01-01",
+                    "end_date": "1843-09-01",
+                    "description": "Wrote the first program\nTranslated the memoir",
+                }
+            ],
+        }
+    ],
+}
+
+
+def fake_upload_to_gcs(data: bytes, blob_name: str, metadata: dict | None = None):
+    # Stands in for the upload and URL signing, which wait on the network
+    time.sleep(UPLOAD_TIME)
+    return f"https://storage.example.com/{blob_name}"
+
+
+# Workers import this module as their app, so they upload through the stub
+tasks.upload_to_gcs = fake_upload_to_gcs
+
+
+def start_worker(name: str, queues: list[str], pool: str, concurrency: int, env):
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "celery",
+            "-A",
+            "benchmarks.compile_upload_split:celery_app",
+            "worker",
+            "-Q",
+            ",".join(queues),
+            "-n",
+            f"{name}@benchmark",
+            f"--pool={pool}",
+            f"--concurrency={concurrency}",
+            "--without-gossip",
+            "--without-mingle",
+            "--loglevel=error",
+        ],
+        cwd=TEXIFY_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def wait_for_workers(count: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if len(celery_app.control.ping(timeout=1) or []) >= count:
+            return
+    raise RuntimeError("Workers did not start in time")
+
+
+def measure(mode: str, args, env) -> float:
+    redis_client.delete(*QUEUES)
+
+    if mode == "combined":
+        # Uploads hold a compile slot, as when they ran inside the compile task
+        workers = [
+            start_worker("compile", QUEUES, "prefork", args.compile_concurrency, env)
+        ]
+    else:
+        workers = [
+            start_worker(
+                "compile", QUEUES[:2], "prefork", args.compile_concurrency, env
+            ),
+            start_worker("upload", ["upload"], "threads", args.upload_concurrency, env),
+        ]
+
+    try:
+        wait_for_workers(len(workers))
+        start = time.monotonic()
+        results = [
+            tasks.compile_latex_to_pdf.delay("resume.j2", dict(RESUME, id=i))
+            for i in range(args.jobs)
+        ]
+        for result in results:
+            result.get(timeout=600)
+        return time.monotonic() - start
+    finally:
+        for worker in workers:
+            worker.send_signal(signal.SIGTERM)
+        for worker in workers:
+            worker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--compile-concurrency", type=int, default=4)
+    parser.add_argument("--upload-concurrency", type=int, default=16)
+    parser.add_argument("--compile-time", type=float, default=0.2, help="seconds")
+    parser.add_argument("--upload-time", type=float, default=0.3, help="seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as bin_dir:
+        pdflatex = os.path.join(bin_dir, "pdflatex")
+        with open(pdflatex, "w") as f:
+            f.write(FAKE_PDFLATEX.format(compile_time=args.compile_time))
+        os.chmod(pdflatex, os.stat(pdflatex).st_mode | stat.S_IEXEC)
+
+        env = dict(
+            os.environ,
+            PATH=f"{bin_dir}{os.pathsep}{os.environ['PATH']}",
+            BENCHMARK_UPLOAD_TIME=str(args.upload_time),
+        )
+
+        print(f"{'workers':<10}{'jobs':>8}{'seconds':>10}{'jobs/s':>10}")
+        for mode in ("combined", "split"):
+            elapsed = measure(mode, args, env)
+            print(
+                f"{mode:<10}{args.jobs:>8}{elapsed:>10.2f}{args.jobs / elapsed:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
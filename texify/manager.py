@@ -1,10 +1,35 @@
 import os
+import redis
 from celery import Celery
 
 REDIS_IP = os.environ.get("REDIS_IP") or "redis"
 
+# How often (seconds) stale compiled PDFs are removed from the bucket
+PDF_CLEANUP_INTERVAL = int(os.environ.get("PDF_CLEANUP_INTERVAL") or 3600)
+
 celery_app = Celery(
     "texify",
     broker=f"redis://{REDIS_IP}:6379/0",
 )
 celery_app.conf.update(result_backend=f"redis://{REDIS_IP}:6379/1", include=["tasks"])
+
+# Shared with the broker, used for queue backlogs and worker cache statistics
+redis_client = redis.Redis(host=REDIS_IP, port=6379, db=0)
+
+# Compiles are CPU bound and run on a prefork pool, routed to the shard with
+# the warmest caches, while uploads and other network I/O run on a separate,
+# thread pooled worker
+celery_app.conf.task_routes = (
+    "routing.route_compile_task",
+    {
+        "tasks.compile_latex_to_pdf": {"queue": "compile"},
+        "tasks.upload_pdf": {"queue": "upload"},
+        "tasks.cleanup_compiled_pdfs": {"queue": "upload"},
+    },
+)
+celery_app.conf.beat_schedule = {
+    "cleanup-compiled-pdfs": {
+        "task": "tasks.cleanup_compiled_pdfs",
+        "schedule": PDF_CLEANUP_INTERVAL,
+    },
+}
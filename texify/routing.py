@@ -0,0 +1,87 @@
+import os
+import hashlib
+
+from manager import redis_client
+
+# Number of compile shards. Each texify replica consumes one shard queue plus
+# the shared compile queue (see start.sh). The API routes the compiles it
+# enqueues itself the same way, keep api/texify_client.py in sync.
+COMPILE_SHARDS = int(os.environ.get("COMPILE_SHARDS") or 1)
+# Backlog at which a shard is considered overloaded and work spills over
+COMPILE_SPILL_THRESHOLD = int(os.environ.get("COMPILE_SPILL_THRESHOLD") or 8)
+# Also take the user into account when picking a shard
+COMPILE_AFFINITY_BY_USER = os.environ.get("COMPILE_AFFINITY_BY_USER") == "1"
+
+# Consumed by every compile worker, used when all preferred shards are busy
+SHARED_COMPILE_QUEUE = "compile"
+
+CACHE_STATS_KEY = "texify:cache_stats"
+
+
+def shard_queue(shard: int) -> str:
+    return f"{SHARED_COMPILE_QUEUE}.{shard}"
+
+
+def rank_shards(key: str) -> list[int]:
+    """
+    Orders shards by preference for a key using rendezvous hashing, so adding
+    or removing a shard only moves the keys that belonged to it.
+    """
+
+    def score(shard: int) -> int:
+        return int(hashlib.md5(f"{key}:{shard}".encode("utf-8")).hexdigest(), 16)
+
+    return sorted(range(COMPILE_SHARDS), key=score, reverse=True)
+
+
+def affinity_key(data: dict) -> str:
+    key = str(data.get("template_id"))
+    if COMPILE_AFFINITY_BY_USER:
+        key += f":{data.get('user_id')}"
+    return key
+
+
+def route_compile_task(name, args, kwargs, options, task=None, **kw):
+    """
+    Celery router sending compiles to the shard whose workers most likely have
+    the template warm. Overloaded shards spill to the next shard in preference
+    order, and to the shared queue once every shard is overloaded.
+    """
+    if name != "tasks.compile_latex_to_pdf" or not args or len(args) < 2:
+        return None
+
+    ranked = rank_shards(affinity_key(args[1] or {}))
+
+    pipe = redis_client.pipeline()
+    for shard in ranked:
+        pipe.llen(shard_queue(shard))
+    backlogs = pipe.execute()
+
+    for shard, backlog in zip(ranked, backlogs):
+        if backlog < COMPILE_SPILL_THRESHOLD:
+            return {"queue": shard_queue(shard)}
+    return {"queue": SHARED_COMPILE_QUEUE}
+
+
+def record_cache_stat(worker: str, hit: bool):
+    # Only a metric, a compile must not fail because it couldn't be recorded
+    try:
+        redis_client.hincrby(f"{CACHE_STATS_KEY}:{worker}", "hits" if hit else "misses")
+    except Exception as e:
+        print(f"Could not record cache stat of {worker}: {e}")
+
+
+def get_cache_stats() -> dict[str, dict]:
+    stats = {}
+    for key in redis_client.scan_iter(f"{CACHE_STATS_KEY}:*"):
+        key = key.decode("utf-8")
+        values = redis_client.hgetall(key)
+        hits = int(values.get(b"hits", 0))
+        misses = int(values.get(b"misses", 0))
+        total = hits + misses
+        stats[key.removeprefix(f"{CACHE_STATS_KEY}:")] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else None,
+        }
+    return stats
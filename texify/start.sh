@@ -1,7 +1,20 @@
 #!/bin/bash
 
-# Start Celery worker
-celery -A manager worker --loglevel=info &
+# Start CPU bound compile worker (one process per core) on this replica's
+# shard queue and the shared compile queue
+celery -A manager worker -Q compile.${TEXIFY_SHARD:-0},compile -n compile@%h \
+    --loglevel=info &
+
+# Periodic cleanup must be scheduled exactly once across replicas, so only
+# the shard 0 replica embeds the beat scheduler unless TEXIFY_BEAT overrides it
+BEAT_FLAG=""
+if [ "${TEXIFY_BEAT:-$([ "${TEXIFY_SHARD:-0}" = "0" ] && echo 1)}" = "1" ]; then
+    BEAT_FLAG="--beat"
+fi
+
+# Start I/O bound upload worker
+celery -A manager worker -Q upload -n upload@%h --pool=threads \
+    --concurrency=${UPLOAD_CONCURRENCY:-16} $BEAT_FLAG --loglevel=info &
 
 # Start flask server
 gunicorn -w 1 -b 0.0.0.0:8080 app:app --log-level DEBUG
@@ -2,13 +2,19 @@ import os
 import subprocess
 import tempfile
 import json
+import base64
+import hashlib
 
 from datetime import datetime
 
 from jinja2 import Environment, FileSystemLoader
 
 from manager import celery_app
-from utils import upload_to_gcs
+from routing import record_cache_stat
+from utils import upload_to_gcs, delete_stale_pdfs
+
+# Number of compiled PDFs to keep per resume when cleaning up the bucket
+PDF_RETENTION_COUNT = int(os.environ.get("PDF_RETENTION_COUNT") or 3)
 
 
 def escape_latex(value):
@@ -33,6 +39,8 @@ def escape_latex(value):
 class LatexEnvironment(Environment):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        # Templates already compiled and cached by this worker
+        self.loaded_templates = set()
 
     def _render_with_escaped_context(self, template_name, context):
         def auto_escape(value):
@@ -47,22 +55,35 @@ class LatexEnvironment(Environment):
 
         escaped_context = {k: auto_escape(v) for k, v in context.items()}
         template = self.get_template(template_name)
+        self.loaded_templates.add(template_name)
         return template.render(escaped_context)
 
 
+# Shared by every task run in this worker so compiled templates stay warm
+env = LatexEnvironment(
+    loader=FileSystemLoader("."),
+    comment_start_string="{=",
+    comment_end_string="=}",
+    autoescape=False,
+)
+
+
 @celery_app.task(bind=True, max_retries=0, track_started=True)
 def compile_latex_to_pdf(self, template_url: str, data: any) -> str:
     """
-    Compiles a LaTeX file to a PDF and uploads contents to
-    Google Cloud Storage and returns a URL to Google Cloud Storage.
+    Compiles a LaTeX file to a PDF and hands the upload off to `upload_pdf`
+    on the I/O queue, so the compile worker is free for the next document.
+    The upload keeps this task's id, so its result is the URL to Google Cloud
+    Storage.
     """
     try:
-        env = LatexEnvironment(
-            loader=FileSystemLoader("."),
-            comment_start_string="{=",
-            comment_end_string="=}",
-            autoescape=False,
-        )
+        # Tag uploads so the cleanup job can group PDFs per resume
+        content_hash = hashlib.sha256(
+            json.dumps(data, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        metadata = {"content_hash": content_hash}
+        if data.get("id") is not None:
+            metadata["resume_id"] = str(data.get("id"))
 
         # Preprocess data
         new_data = data.copy()
@@ -88,7 +109,10 @@ def compile_latex_to_pdf(self, template_url: str, data: any) -> str:
         del new_data["sections"]
 
         # TODO(bliutech): add support for downloading templates and selecting them
-        latex_code = env._render_with_escaped_context("resume.j2", new_data)
+        template_name = "resume.j2"
+        cache_hit = template_name in env.loaded_templates
+        latex_code = env._render_with_escaped_context(template_name, new_data)
+        record_cache_stat(self.request.hostname, cache_hit)
 
         with tempfile.TemporaryDirectory() as tmpdir:
             tex_path = os.path.join(tmpdir, "document.tex")
@@ -119,8 +143,36 @@ def compile_latex_to_pdf(self, template_url: str, data: any) -> str:
 
             print("Finished compiling")
 
-            return upload_to_gcs(pdf_path, f"{self.request.id}.pdf")
+            with open(pdf_path, "rb") as f:
+                pdf = base64.b64encode(f.read()).decode("ascii")
 
     except Exception as exc:
         print("Retrying...")
         raise self.retry(exc=exc, countdown=5)
+
+    # Must be raised outside of the try block above since it raises Ignore
+    raise self.replace(upload_pdf.s(pdf, metadata))
+
+
+@celery_app.task(bind=True, max_retries=3)
+def upload_pdf(self, pdf: str, metadata: dict) -> str:
+    """
+    Uploads a compiled (base64 encoded) PDF to Google Cloud Storage and
+    returns a URL to it.
+    """
+    try:
+        return upload_to_gcs(base64.b64decode(pdf), f"{self.request.id}.pdf", metadata)
+    except Exception as exc:
+        print("Retrying upload...")
+        raise self.retry(exc=exc, countdown=5)
+
+
+@celery_app.task
+def cleanup_compiled_pdfs(keep: int = PDF_RETENTION_COUNT) -> dict:
+    """
+    Periodically deletes old compiled PDFs from Google Cloud Storage, keeping
+    the latest `keep` PDFs per resume and anything behind a live signed URL.
+    """
+    deleted, reclaimed = delete_stale_pdfs(keep)
+    print(f"Deleted {deleted} stale PDFs, reclaimed {reclaimed} bytes")
+    return {"deleted": deleted, "bytes_reclaimed": reclaimed}
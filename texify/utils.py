@@ -1,4 +1,5 @@
 import os
+from datetime import datetime, timedelta, timezone
 from google.cloud import storage
 from google.cloud.storage.client import Client
 from google.auth.credentials import AnonymousCredentials
@@ -9,6 +10,9 @@ load_dotenv()
 USE_EMULATOR = os.getenv("GCS_EMULATOR") == "1"
 BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
 
+# Lifetime of the signed URLs handed back to clients (seconds)
+SIGNED_URL_EXPIRATION = 3600
+
 
 def get_storage_client() -> Client:
     if USE_EMULATOR:
@@ -21,7 +25,7 @@ def get_storage_client() -> Client:
         return storage.Client()
 
 
-def upload_to_gcs(file_path: str, blob_name: str) -> str:
+def upload_to_gcs(data: bytes, blob_name: str, metadata: dict | None = None) -> str:
     client = get_storage_client()
     bucket = client.bucket(BUCKET_NAME)
 
@@ -30,10 +34,61 @@ def upload_to_gcs(file_path: str, blob_name: str) -> str:
         bucket = client.create_bucket(BUCKET_NAME)
 
     blob = bucket.blob(blob_name)
-    blob.upload_from_filename(file_path)
+    if metadata:
+        blob.metadata = metadata
+    blob.upload_from_string(data, content_type="application/pdf")
 
     if USE_EMULATOR:
         # Construct URL manually (no signed URL support in emulator)
         return f"{os.getenv('GCS_EMULATOR_HOST').replace('gcs', 'localhost')}/download/storage/v1/b/{BUCKET_NAME}/o/{blob_name}"
     else:
-        return blob.generate_signed_url(version="v4", expiration=3600, method="GET")
+        return blob.generate_signed_url(
+            version="v4", expiration=SIGNED_URL_EXPIRATION, method="GET"
+        )
+
+
+def delete_stale_pdfs(keep: int) -> tuple[int, int]:
+    """
+    Deletes compiled PDFs that are no longer needed. For every resume (or
+    content hash for uploads without a resume id) the latest `keep` PDFs are
+    kept, as is anything young enough to still be referenced by a live signed
+    URL. PDFs without either tag predate tagging and are deleted once their
+    signed URLs have expired. Returns the number of deleted blobs and the
+    bytes reclaimed.
+    """
+    client = get_storage_client()
+    bucket = client.bucket(BUCKET_NAME)
+
+    if USE_EMULATOR and not bucket.exists():
+        return 0, 0
+
+    # Anything uploaded after this point may still be served by a signed URL
+    live_cutoff = datetime.now(timezone.utc) - timedelta(seconds=SIGNED_URL_EXPIRATION)
+
+    groups = {}
+    stale = []
+    for blob in client.list_blobs(BUCKET_NAME):
+        if not blob.name.endswith(".pdf"):
+            continue
+        metadata = blob.metadata or {}
+        group = metadata.get("resume_id") or metadata.get("content_hash")
+        if group:
+            groups.setdefault(group, []).append(blob)
+        elif blob.time_created and blob.time_created <= live_cutoff:
+            stale.append(blob)
+
+    for blobs in groups.values():
+        blobs.sort(key=lambda b: b.time_created, reverse=True)
+        for blob in blobs[keep:]:
+            if blob.time_created and blob.time_created > live_cutoff:
+                continue
+            stale.append(blob)
+
+    if not stale:
+        return 0, 0
+
+    # Failed deletes are retried on the next run, so only count the rest
+    failed = set()
+    bucket.delete_blobs(stale, on_error=lambda blob: failed.add(blob.name))
+    deleted = [blob for blob in stale if blob.name not in failed]
+    return len(deleted), sum(blob.size or 0 for blob in deleted)
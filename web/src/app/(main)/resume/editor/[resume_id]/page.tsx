@@ -1,6 +1,6 @@
 "use client";
 
-import { useState, useEffect, useCallback } from "react";
+import { useState, useEffect, useCallback, useRef } from "react";
 import ResumeSection from "@/components/resume/ResumeSectionCard";
 import { Button } from "@/components/ui/button";
 import { EyeIcon, SaveIcon, SparklesIcon, DownloadIcon } from "lucide-react";
@@ -10,6 +10,7 @@ import LoadingSpinner from "@/components/loading/LoadingSpinner";
 import LabelledInput from "@/components/ui/LabelledInput";
 import { Input } from "@/components/ui/input";
 import { parseDates } from "@/lib/utils/date";
+import { buildResumePatch } from "@/lib/utils/patch";
 import { ChevronLeft, ChevronRight } from "lucide-react";
 import ResumeTOC from "@/components/resume/ResumeTOC";
 import { DragEndEvent } from "@dnd-kit/core";
@@ -52,6 +53,9 @@ const MobileViewToggle = ({ mobileView, setMobileView }: { mobileView: 'editor'
 // Hook for resume state management - future-proofed for backend sync
 function useResumeEditor(resumeId: string) {
     const [resume, setResume] = useState<ResumeType | null>(null);
+    // Last saved state of the resume and its ETag, autosaves only send what changed since
+    const savedResumeRef = useRef<ResumeType | null>(null);
+    const etagRef = useRef<string | null>(null);
     const [isLoading, setIsLoading] = useState(true);
     const [hasUnsavedChanges, setHasUnsavedChanges] = useState(false);
     const [syncMessage, setSyncMessage] = useState<string | null>(null);
@@ -96,38 +100,67 @@ function useResumeEditor(resumeId: string) {
                 return;
             }
 
-            const poll = async () => {
-                const statusResponse = await fetch(`/api/compile/status/${task_id}`);
-                if (!statusResponse.ok) {
-                    // Stop polling on server error
-                    clearInterval(intervalId);
-                    setCompilationError("Could not retrieve compilation status from the server.");
-                    setIsCompiling(false);
-                    setIsSaving(false);
-                    return;
-                }
-
-                const result = await statusResponse.json();
-
-                console.log("Poll result:", result);
-
+            // Returns true once the compilation is over, successfully or not
+            const handleResult = (result: { status: string; url?: string; error?: string }) => {
                 if (result.status === 'done') {
-                    setPdfUrl(result.url);
-                    clearInterval(intervalId);
-                    setIsCompiling(false);
-                    setIsSaving(false);
+                    setPdfUrl(result.url ?? null);
                 } else if (result.status === 'failure') {
                     const errorMessage = result.error || "An unknown compilation error occurred.";
                     console.error("PDF Compilation failed:", errorMessage);
                     setCompilationError(errorMessage);
-                    clearInterval(intervalId);
-                    setIsCompiling(false);
-                    setIsSaving(false);
+                } else {
+                    return false;
                 }
-                // If 'pending', do nothing and let it poll again
+                setIsCompiling(false);
+                setIsSaving(false);
+                return true;
             };
 
-            const intervalId = setInterval(poll, 2000); // Poll every 2 seconds
+            const startPolling = () => {
+                const poll = async () => {
+                    const statusResponse = await fetch(`/api/compile/status/${task_id}`);
+                    if (!statusResponse.ok) {
+                        // Stop polling on server error
+                        clearInterval(intervalId);
+                        setCompilationError("Could not retrieve compilation status from the server.");
+                        setIsCompiling(false);
+                        setIsSaving(false);
+                        return;
+                    }
+
+                    const result = await statusResponse.json();
+
+                    console.log("Poll result:", result);
+
+                    // If 'pending', do nothing and let it poll again
+                    if (handleResult(result)) clearInterval(intervalId);
+                };
+
+                const intervalId = setInterval(poll, 2000); // Poll every 2 seconds
+            };
+
+            if (typeof EventSource === "undefined") {
+                startPolling();
+                return;
+            }
+
+            // Status changes are pushed as they happen. The browser reconnects by
+            // itself when the stream ends while the compile is still pending.
+            const events = new EventSource(`/api/compile/status/${task_id}/stream`);
+            let receivedStatus = false;
+            events.onmessage = (event) => {
+                receivedStatus = true;
+                const result = JSON.parse(event.data);
+                console.log("Status update:", result);
+                if (handleResult(result)) events.close();
+            };
+            events.onerror = () => {
+                // Fall back to polling if the stream can't be (re)opened
+                if (!receivedStatus || events.readyState === EventSource.CLOSED) {
+                    events.close();
+                    startPolling();
+                }
+            };
         } catch (error) {
             const errorMessage = error instanceof Error ? error.message : "An unknown error occurred.";
             console.error("Error during compilation process:", error);
@@ -199,6 +232,8 @@ function useResumeEditor(resumeId: string) {
                 // Recursively parse date strings into Date objects
                 const resumeDataWithDates = parseDates(data) as ResumeType;
 
+                savedResumeRef.current = resumeDataWithDates;
+                etagRef.current = response.headers.get('ETag');
                 setResume(resumeDataWithDates);
                 startCompilation(); // Initial compilation
             } catch (error) {
@@ -408,6 +443,50 @@ function useResumeEditor(resumeId: string) {
         setCompilationError(null);
 
         try {
+            // Send only the changes since the last save when they can be expressed as a patch
+            const patch = savedResumeRef.current && etagRef.current
+                ? buildResumePatch(savedResumeRef.current, resume)
+                : null;
+            if (patch && patch.operations.length === 0) {
+                // Edits were reverted, the resume is already saved as it is
+                setHasUnsavedChanges(false);
+                setIsSaving(false);
+                return;
+            }
+            if (patch) {
+                const response = await fetch(`/api/resume/${resume.id}`, {
+                    method: 'PATCH',
+                    headers: { 'Content-Type': 'application/json-patch+json', 'If-Match': etagRef.current! },
+                    body: JSON.stringify(patch.operations),
+                }).catch(() => null);
+
+                if (response?.ok) {
+                    const data = await response.json();
+                    // Swap the temporary ids of added items for the ids they were saved with
+                    const newIds = new Map(patch.addedItemIds.map((id, i) => [id, data.added_ids[i] as number]));
+                    const withNewIds = (r: ResumeType): ResumeType => ({
+                        ...r,
+                        sections: r.sections.map(section => ({
+                            ...section,
+                            items: section.items.map(item => ({ ...item, id: newIds.get(item.id) ?? item.id })),
+                        })),
+                    });
+                    savedResumeRef.current = withNewIds(resume);
+                    etagRef.current = response.headers.get('ETag');
+                    setResume(prev => prev && withNewIds(prev));
+                    setHasUnsavedChanges(false);
+                    startCompilation();
+                    return;
+                }
+                if (response?.status === 400) {
+                    const errorData = await response.json();
+                    setSaveError(errorData.error || "An unknown validation error occurred.");
+                    setIsSaving(false);
+                    return;
+                }
+                // Otherwise (e.g. the resume changed elsewhere), save the whole resume below
+            }
+
             const payload: ResumeUpdatePayload = {
                 ...resume,
                 sections: resume.sections.map(section => ({
@@ -441,6 +520,8 @@ function useResumeEditor(resumeId: string) {
                 const data = await response.json();
                 console.log('Resume saved, server response:', data);
                 const resumeDataWithDates = parseDates(data) as ResumeType;
+                savedResumeRef.current = resumeDataWithDates;
+                etagRef.current = response.headers.get('ETag');
                 setResume(resumeDataWithDates);
                 setHasUnsavedChanges(false);
                 setSaveError(null);
@@ -461,20 +542,31 @@ function useResumeEditor(resumeId: string) {
         setIsRatingModalOpen(true);
 
         try {
-            const response = await fetch(`/api/ai/rate/${resumeId}`);
-
-            if (!response.ok) {
-                let errorMsg = `An error occurred: ${response.statusText} (${response.status})`;
-                try {
-                    const errorData = await response.json();
-                    errorMsg = errorData.error || errorMsg;
-                } catch {
-                    // JSON parsing failed, stick with the status text.
+            const readResponse = async (response: Response) => {
+                if (!response.ok) {
+                    let errorMsg = `An error occurred: ${response.statusText} (${response.status})`;
+                    try {
+                        const errorData = await response.json();
+                        errorMsg = errorData.error || errorMsg;
+                    } catch {
+                        // JSON parsing failed, stick with the status text.
+                    }
+                    throw new Error(errorMsg);
                 }
-                throw new Error(errorMsg);
+                return response.json();
+            };
+
+            // Ratings run in the background, poll the job until it is over
+            let data = await readResponse(await fetch(`/api/ai/rate/${resumeId}`, { method: 'POST' }));
+            const jobId = data.job_id;
+            while (data.status === 'pending') {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                data = await readResponse(await fetch(`/api/ai/rate/jobs/${jobId}`));
             }
 
-            const data = await response.json();
+            if (data.status === 'failure') {
+                throw new Error(data.error || "An unknown error occurred while rating the resume.");
+            }
 
             if (!data.rating || !data.reasoning) {
                 throw new Error("The AI returned an invalid response. Please try again.");
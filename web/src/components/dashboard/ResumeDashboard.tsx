@@ -2,7 +2,7 @@
 import Link from "next/link"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
-import { PlusIcon, FileTextIcon, CalendarIcon, EditIcon, Trash2Icon } from "lucide-react"
+import { PlusIcon, FileTextIcon, CalendarIcon, EditIcon, Trash2Icon, CopyIcon } from "lucide-react"
 import {
   AlertDialog,
   AlertDialogAction,
@@ -29,14 +29,21 @@ export default function ResumeDashboard() {
   useEffect(() => {
     const fetchResumes = async () => {
       try {
-        const response = await fetch('/api/resume/all');
-        if (!response.ok) {
-          throw new Error('Failed to fetch resumes');
-        }
-        const data = await response.json();
-        
+        // Follow the cursor through every page of resume summaries
+        const allResumes = [];
+        let cursor: number | null = null;
+        do {
+          const response = await fetch(cursor ? `/api/resume/all?after=${cursor}` : '/api/resume/all');
+          if (!response.ok) {
+            throw new Error('Failed to fetch resumes');
+          }
+          const data = await response.json();
+          allResumes.push(...data.resumes);
+          cursor = data.next_cursor;
+        } while (cursor);
+
         // Use the centralized utility to parse dates in the entire resumes array
-        setResumes(parseDates(data.resumes) as ResumeType[]);
+        setResumes(parseDates(allResumes) as ResumeType[]);
       } catch (error) {
         console.error("Error fetching resumes:", error);
       } finally {
@@ -61,6 +68,17 @@ export default function ResumeDashboard() {
     }
   };
 
+  const handleDuplicateResume = async (resume: ResumeType) => {
+    try {
+      const response = await fetch(`/api/resume/${resume.id}/clone`, { method: 'POST' });
+      if (!response.ok) throw new Error('Failed to duplicate resume');
+      const newResume = await response.json();
+      router.push(`/resume/editor/${newResume.id}`);
+    } catch (error) {
+      console.error("Error duplicating resume:", error);
+    }
+  };
+
   const handleDeleteResume = async () => {
     if (!resumeToDelete) return;
 
@@ -155,6 +173,15 @@ export default function ResumeDashboard() {
                                 Edit
                               </Button>
                             </Link>
+                            <Button
+                              size="sm"
+                              variant="outline"
+                              className="flex items-center gap-1"
+                              onClick={() => handleDuplicateResume(resume)}
+                              aria-label="Duplicate Resume"
+                            >
+                              <CopyIcon className="h-3 w-3" />
+                            </Button>
                             <Button
                               size="sm"
                               variant="destructive"
@@ -0,0 +1,83 @@
+import { ResumeItemType, ResumeType } from "@/lib/types/Resume";
+
+// A patch operation as accepted by PATCH /api/resume/<id>.
+// Sections and items are addressed by id, not by array index.
+export interface ResumePatchOperation {
+  op: "replace" | "add" | "remove";
+  path: string;
+  value?: unknown;
+}
+
+const RESUME_FIELDS = ["resume_name", "name", "phone", "email", "linkedin", "github", "website"] as const;
+const ITEM_FIELDS = ["title", "organization", "start_date", "end_date", "location", "description"] as const;
+
+const toPatchValue = (value: unknown) => (value instanceof Date ? value.toISOString() : value);
+
+const isSameValue = (a: unknown, b: unknown) =>
+  a instanceof Date && b instanceof Date ? a.getTime() === b.getTime() : a === b;
+
+// The operations of a patch, and the temporary ids of the items it adds in the
+// order of their add operations (the response has their new ids in that order)
+export interface ResumePatch {
+  operations: ResumePatchOperation[];
+  addedItemIds: (string | number)[];
+}
+
+const itemPayload = (item: ResumeItemType) =>
+  Object.fromEntries(ITEM_FIELDS.map(field => [field, toPatchValue(item[field])]));
+
+// Builds the operations turning the last saved resume into the current one.
+// Returns null when the change can't be expressed as a patch (sections added or
+// reordered, items reordered or inserted before existing ones), in which case
+// the whole resume has to be saved instead.
+export const buildResumePatch = (saved: ResumeType, current: ResumeType): ResumePatch | null => {
+  const operations: ResumePatchOperation[] = [];
+  const addedItemIds: (string | number)[] = [];
+
+  for (const field of RESUME_FIELDS) {
+    if (!isSameValue(saved[field], current[field])) {
+      operations.push({ op: "replace", path: `/${field}`, value: current[field] });
+    }
+  }
+
+  if (saved.sections.length !== current.sections.length) return null;
+  for (let i = 0; i < current.sections.length; i++) {
+    const savedSection = saved.sections[i];
+    const section = current.sections[i];
+    if (typeof section.id === "string" || section.id !== savedSection.id) return null;
+    const sectionPath = `/sections/${section.id}`;
+
+    if (section.name !== savedSection.name) {
+      operations.push({ op: "replace", path: `${sectionPath}/name`, value: section.name });
+    }
+
+    // Existing items must keep their relative order, new ones are appended
+    const savedItems = new Map(savedSection.items.map(item => [item.id, item]));
+    const keptIds = section.items.filter(item => savedItems.has(item.id)).map(item => item.id);
+    const savedKeptIds = savedSection.items.filter(item => keptIds.includes(item.id)).map(item => item.id);
+    if (keptIds.some((id, index) => id !== savedKeptIds[index])) return null;
+    const firstNewIndex = section.items.findIndex(item => !savedItems.has(item.id));
+    if (firstNewIndex !== -1 && firstNewIndex < keptIds.length) return null;
+
+    for (const item of section.items) {
+      const savedItem = savedItems.get(item.id);
+      if (!savedItem) {
+        operations.push({ op: "add", path: `${sectionPath}/items/-`, value: itemPayload(item) });
+        addedItemIds.push(item.id);
+        continue;
+      }
+      for (const field of ITEM_FIELDS) {
+        if (!isSameValue(savedItem[field], item[field])) {
+          operations.push({ op: "replace", path: `${sectionPath}/items/${item.id}/${field}`, value: toPatchValue(item[field]) });
+        }
+      }
+    }
+    for (const savedItem of savedSection.items) {
+      if (!keptIds.includes(savedItem.id)) {
+        operations.push({ op: "remove", path: `${sectionPath}/items/${savedItem.id}` });
+      }
+    }
+  }
+
+  return { operations, addedItemIds };
+};